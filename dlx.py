@@ -0,0 +1,167 @@
+# Dancing Links
+
+class DancingLinks(object):
+  def __init__(self, column_count, rows):
+    """
+    An exact cover problem, solved with Donald Knuth's Dancing Links
+    (https://en.wikipedia.org/wiki/Dancing_Links).
+
+    'column_count' is the number of columns, which are numbered from 0, and
+    'rows' is a list of rows, each of which is a list of the columns it
+    covers.  A solution is a list of rows (by index into 'rows') which covers
+    every column exactly once.
+
+    Every 1 in the matrix is a node, and each node is linked to its
+    neighbours to the left and right (in the same row) and up and down (in
+    the same column).  Rather than objects, the links are kept in flat lists
+    indexed by node number, which is quicker to follow.  Node 0 is the root,
+    nodes 1 to column_count are the column headers and the rest are the rows'
+    nodes:
+
+    root - header 1 - header 2 - header 3 - (back to root)
+              |          |          |
+              |        node 4 --- node 5 - (back to node 4)  <- row 0
+              |          |          |
+            node 6 ----------------node 7 - (back to node 6) <- row 1
+    """
+
+    header_count = column_count + 1
+
+    # Links of each node, starting with the root and column headers
+    self.left  = [n - 1 for n in range(header_count)]
+    self.right = [n + 1 for n in range(header_count)]
+    self.left[0] = column_count
+    self.right[column_count] = 0
+    self.up    = list(range(header_count))
+    self.down  = list(range(header_count))
+    # The column header of each node
+    self.column = list(range(header_count))
+    # The row of each node (the root and headers have none)
+    self.row = [None] * header_count
+    # The number of nodes in each column
+    self.size = [0] * header_count
+
+    for row_index, row in enumerate(rows):
+      first = None
+      for column in row:
+        header = column + 1
+        node = len(self.column)
+
+        # Add to the bottom of the column
+        self.up.append(self.up[header])
+        self.down.append(header)
+        self.down[self.up[header]] = node
+        self.up[header] = node
+        self.column.append(header)
+        self.row.append(row_index)
+        self.size[header] += 1
+
+        # Add to the end of the row
+        if first is None:
+          first = node
+          self.left.append(node)
+          self.right.append(node)
+        else:
+          self.left.append(self.left[first])
+          self.right.append(first)
+          self.right[self.left[first]] = node
+          self.left[first] = node
+
+  def cover(self, header):
+    """Remove a column, and every row which covers it, from the matrix."""
+
+    left, right, up, down = self.left, self.right, self.up, self.down
+    column, size = self.column, self.size
+
+    right[left[header]] = right[header]
+    left[right[header]] = left[header]
+    i = down[header]
+    while i != header:
+      j = right[i]
+      while j != i:
+        down[up[j]] = down[j]
+        up[down[j]] = up[j]
+        size[column[j]] -= 1
+        j = right[j]
+      i = down[i]
+
+  def uncover(self, header):
+    """Put back a column removed by cover(), in exactly the reverse order."""
+
+    left, right, up, down = self.left, self.right, self.up, self.down
+    column, size = self.column, self.size
+
+    i = up[header]
+    while i != header:
+      j = left[i]
+      while j != i:
+        size[column[j]] += 1
+        down[up[j]] = j
+        up[down[j]] = j
+        j = left[j]
+      i = up[i]
+    right[left[header]] = header
+    left[right[header]] = header
+
+  def solve(self, cancelled=None):
+    """
+    Return the first solution found, or None if there isn't one.
+
+    'cancelled' is an optional function which is called for every row tried
+    and, if it returns True, the search is abandoned and None is returned.
+    The matrix is left in an unknown state once the search has been
+    abandoned.
+    """
+
+    left, right, down = self.left, self.right, self.down
+    column, size = self.column, self.size
+
+    solution = []
+
+    def search():
+      """Algorithm X, returns True if a solution is found."""
+
+      if right[0] == 0:
+        # Every column is covered
+        return True
+
+      # Choose the column with the fewest rows
+      header = right[0]
+      j = right[header]
+      while j != 0:
+        if size[j] < size[header]:
+          header = j
+        j = right[j]
+      if not size[header]:
+        return False
+
+      self.cover(header)
+      r = down[header]
+      while r != header:
+        if cancelled is not None and cancelled():
+          return None
+
+        solution.append(r)
+        j = right[r]
+        while j != r:
+          self.cover(column[j])
+          j = right[j]
+
+        found = search()
+        if found or found is None:
+          return found
+
+        j = left[r]
+        while j != r:
+          self.uncover(column[j])
+          j = left[j]
+        solution.pop()
+        r = down[r]
+      self.uncover(header)
+
+      return False
+
+    if search():
+      return [self.row[node] for node in solution]
+
+    return None
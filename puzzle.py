@@ -1,7 +1,10 @@
-import time, random
-from collections import defaultdict
+import sys, time, random, multiprocessing
+from collections import defaultdict, OrderedDict
+from Queue import Empty
 from itertools import combinations
+from bisect import bisect_left, insort
 from ttws_types import *
+from dlx import DancingLinks
 
 class Puzzle(object):
   def __init__(self, width, height):
@@ -40,6 +43,28 @@ class Puzzle(object):
     # A list of areas calculated by the solver
     self.areas = []
 
+    # Whether an area is valid (and what was removed from it by elimination
+    # marks) and the approximate size of the entry in bytes, keyed by the
+    # area's signature.  Once the entries take up more than about
+    # area_cache_size bytes, the least recently used are forgotten.
+    self.area_cache = OrderedDict()
+    self.area_cache_size = 32 * 1024 * 1024
+    self.area_cache_bytes = 0
+    self.area_cache_hits = 0
+    self.area_cache_misses = 0
+
+    # A map from a set of tetris pieces to the target areas (as bitmasks)
+    # which they can and can't be layered to leave exactly.  This only depends
+    # on the size of the board so is kept between solves and, if tetris_cache
+    # is a TetrisCache, also stored on disk (committed whenever observers are
+    # yielded to and when the search stops).  Once the results take up more
+    # than about blue_tetris_cache_size bytes, the least recently used sets of
+    # pieces are forgotten.
+    self.blue_tetris_areas = OrderedDict()
+    self.blue_tetris_cache_size = 64 * 1024 * 1024
+    self.blue_tetris_bytes = 0
+    self.tetris_cache = None
+
     # Yield to observers after yield_interval to allow some other processing
     # to take place while the puzzle is being solved
     self.observers = []
@@ -49,6 +74,20 @@ class Puzzle(object):
     # Whether the puzzle is currently being solved or not
     self.keep_solving = False
 
+    # The number of processes to solve with, searching different paths at the
+    # same time
+    self.processes = 1
+
+    # In a worker process, a queue of paths to search shared with the other
+    # workers, how many workers are waiting for a path and how many paths have
+    # not been searched yet
+    self.tasks = None
+    self.idle = None
+    self.outstanding = None
+
+    # While solving in parallel, an event which cancels every worker
+    self.cancel = None
+
     self.start_time = None
     self.time_taken = 0
 
@@ -124,263 +163,644 @@ class Puzzle(object):
         self.cells[y][x] = cell
 
 
-  def define_areas(self, path_h_edges, path_v_edges):
-    """Start from the top-left and flood fill to define each area."""
+  def define_areas(self, path_edges):
+    """
+    Start from the top-left and flood fill to define each area, given a
+    bitmask of the edges of the path and its symmetry path.  Each area is a
+    bitmask of its cells (see compile_bitboard()).
+    """
 
     # A list of the cells in each area
     areas = []
 
-    # Keep track of every visited cell
-    visited = set()
+    moves = self.cell_moves(path_edges)
 
-    # Look at every cell to see if it's the start a new area
-    for visit_y in range(self.height):
-      for visit_x in range(self.width):
-        if (visit_x, visit_y) in visited:
-          continue
+    # Start a new area from the first cell which isn't in an area yet
+    remaining = self.cell_mask
+    while remaining:
+      area = self.fill_cells(remaining & -remaining, moves)
+      areas.append(area)
+      remaining &= ~area
 
-        # Start a new area
-        area = set()
-        queue = [(visit_x, visit_y)]
+    return areas
 
-        while queue:
-          x, y = queue.pop(0)
-          # Look for adjacent cells within the path that we have not already
-          # visited
-          if x > 0 and (x, y) not in path_h_edges.union(area):
-            queue.append((x - 1, y))
 
-          if x < self.width - 1 and (x + 1, y) not in path_h_edges.union(area):
-            queue.append((x + 1, y))
+  def cell_moves(self, path_edges):
+    """
+    Return bitmasks of the cells which can step left, up, right and down into
+    a neighbouring cell without crossing the path, given a bitmask of the
+    edges of the path and its symmetry path.
+    """
 
-          if y > 0 and (x, y) not in path_v_edges.union(area):
-            queue.append((x, y - 1))
+    left, up, right, down = self.cell_move_masks
 
-          if y < self.height - 1 and (x, y + 1) not in path_v_edges.union(area):
-            queue.append((x, y + 1))
+    # The V edges above a cell have the same numbering as the cells, and the V
+    # edges below are one row further on
+    up &= ~path_edges
+    down &= ~(path_edges >> self.width)
 
-          area.add((x, y))
-          visited.add((x, y))
+    # The H edges to the left and right of a cell are in rows which are one
+    # longer than a row of cells, so are moved over a row at a time
+    h_edges = path_edges >> (self.width * (self.height + 1))
+    row_mask = (1 << self.width) - 1
+    for y in range(self.height):
+      row = h_edges >> (y * (self.width + 1))
+      left &= ~((row & row_mask) << (y * self.width))
+      right &= ~(((row >> 1) & row_mask) << (y * self.width))
 
-        # This area is filled, add to the list of areas
-        areas.append(area)
+    return left, up, right, down
+
+
+  def fill_cells(self, cells, moves):
+    """
+    Flood fill from a bitmask of cells, given the moves from cell_moves(), and
+    return a bitmask of the area filled.  Each step of the fill moves every
+    cell reached so far at once by shifting the bitmask.
+    """
+
+    left, up, right, down = moves
+    while True:
+      grown = cells | ((cells & left) >> 1) | \
+                      ((cells & up) >> self.width) | \
+                      ((cells & right) << 1) | \
+                      ((cells & down) << self.width)
+      if grown == cells:
+        return cells
+      cells = grown
+
+
+  def area_cells(self, area):
+    """Return a set of the (x, y) cells in a bitmask of cells."""
+
+    cells = set()
+    while area:
+      bit = area & -area
+      cells.add(self.bit_cells[bit])
+      area ^= bit
+
+    return cells
 
-    return areas
 
   def solve_yellow_tetris(self, area, pieces):
     """
     Attempt to exactly fit all given tetris pieces into the given area using
-    Algorithm X (https://en.wikipedia.org/wiki/Knuth%27s_Algorithm_X).
+    Algorithm X (https://en.wikipedia.org/wiki/Knuth%27s_Algorithm_X),
+    implemented with Dancing Links.
+
+    'area' is a bitmask of cells.
     """
 
-    # Neat Python implementation of Algirthm X:
-    # http://www.cs.mcgill.ca/~aassaf9/python/algorithm_x.html
-    def exact_cover(X, Y, solution=[]):
-        if not X:
-            yield list(solution)
-        else:
-            c = min(X, key=lambda c: len(X[c]))
-            for r in list(X[c]):
-                # Yield to observers
-                self.yield_check()
-                if not self.keep_solving:
-                    yield False
-                solution.append(r)
-                cols = select(X, Y, r)
-                for s in exact_cover(X, Y, solution):
-                    yield s
-                deselect(X, Y, r, cols)
-                solution.pop()
-
-    def select(X, Y, r):
-        cols = []
-        for j in Y[r]:
-            for i in X[j]:
-                for k in Y[i]:
-                    if k != j:
-                        X[k].remove(i)
-            cols.append(X.pop(j))
-        return cols
-
-    def deselect(X, Y, r, cols):
-        for j in reversed(Y[r]):
-            X[j] = cols.pop()
-            for i in X[j]:
-                for k in Y[i]:
-                    if k != j:
-                        X[k].add(i)
-
-    # Solve using Algorithm X
-
-    # Add each cell to columns
-    cols = set()
-    for x, y in area:
-      cols.add((x, y))
-
-    # Add each piece to columns
-    for piece in pieces:
-      cols.add(piece)
+    # Every cell in the area is a column (looked up by its bit number),
+    # followed by every piece
+    columns = {}
+    cells = area
+    while cells:
+      bit = cells & -cells
+      columns[bit.bit_length() - 1] = len(columns)
+      cells ^= bit
+    column_count = len(columns) + len(pieces)
+
+    # Add a row for every placement of every piece which fits in the area,
+    # largest pieces first as they are the least likely to fit
+    rows = []
+    outside = ~area
+    covered = 0
+    pieces = sorted(pieces, key=lambda piece: piece.count, reverse=True)
+    for piece_column, piece in enumerate(pieces, len(columns)):
+      piece_rows = len(rows)
+      for mask, cells in self.piece_placements[piece]:
+        if not mask & outside:
+          rows.append([piece_column] + [columns[cell] for cell in cells])
+          covered |= mask
+      if len(rows) == piece_rows:
+        # This piece doesn't fit anywhere
+        return False
+
+    if covered != area:
+      # Some cells can't be reached by any piece
+      return False
+
+    return DancingLinks(column_count, rows).solve(self.stop_check()) \
+           is not None
+
+
+  def yellow_tetris_possible(self, area, pieces):
+    """
+    Quick checks which must pass for the given tetris pieces to exactly fit
+    into the given area (a bitmask of cells), before trying to solve it.
+    """
 
-    # Add a row for every rotation of every piece (if it fits in the area)
-    rows = {}
+    # Every piece must fit within the width and height of the area, in at least
+    # one of its rotations
+    occupied_columns = 0
+    occupied_rows = []
+    for y in range(self.height):
+      row = (area >> (y * self.width)) & self.row_mask
+      if row:
+        occupied_columns |= row
+        occupied_rows.append(y)
+    width = occupied_columns.bit_length() - \
+            (occupied_columns & -occupied_columns).bit_length() + 1
+    height = occupied_rows[-1] - occupied_rows[0] + 1
     for piece in pieces:
-      for rotation in piece.shapes:
-        for x, y in area:
-          piece_area = set()
-          for px, py in rotation:
-            cell = (x + px, y + py)
-            if cell in area:
-              piece_area.add(cell)
-
-          if len(piece_area) == piece.count:
-            # This rotation fits, add the piece to the row
-            n = (piece, tuple(rotation), (x, y))
-            if n in rows and piece not in rows[n]:
-              rows[n].append(piece)
-            else:
-              rows[n] = [piece]
-            # Also add all cell locations
-            rows[n].extend(piece_area)
-
-    cols = {j: set() for j in cols}
-    for i in rows:
-        for j in rows[i]:
-            cols[j].add(i)
-
-    try:
-      solution = exact_cover(cols, rows).next()
-      if not solution:
+      if not any(w <= width and h <= height
+                 for w, h in self.piece_extents[piece]):
         return False
-      # A solution was found
-      return True
-    except StopIteration:
-      # All possibilities exhausted
+
+    # Colour the board like a chessboard.  Wherever a piece is placed, the
+    # difference between the number of black and white cells it covers is the
+    # same apart from its sign, e.g. a T piece always covers 3 of one colour
+    # and 1 of the other.  The differences of all the pieces must add up to
+    # the difference of the area.
+    difference = bin(area & self.black_cells).count("1") - \
+                 bin(area & ~self.black_cells).count("1")
+    differences = set([0])
+    for piece in pieces:
+      piece_difference = self.piece_differences[piece]
+      if piece_difference:
+        differences = set([d + piece_difference for d in differences] +
+                          [d - piece_difference for d in differences])
+    if difference not in differences:
       return False
 
+    return True
 
-  def solve_blue_tetris(self, area, pieces):
-    """
-    Work out valid area shapes for a given set of tetris pieces containing at
-    least one blue and one yellow piece.
 
-    As a blue tetris piece can be in a valid position outside of an area, there
-    is no way (that I can come up with) to validate an area containing a blue
-    tetris piece.
+  def solve_blue_tetris(self, area, pieces, layer=None):
+    """
+    See if a given set of tetris pieces, containing at least one blue and one
+    yellow piece, is valid in the given area (a bitmask of cells).
+
+    As a blue tetris piece can be in a valid position outside of an area, the
+    pieces can't just be fitted into the area.  A further complication is that
+    yellow tetris pieces can overlap and then be cancelled out by a blue tetris
+    piece.
+
+    So, here, we look for a way of layering all the pieces on the board which
+    leaves exactly the area (i.e. a count of one in every cell of the area and
+    zero everywhere else) or which leaves nothing at all, as blues and yellows
+    cancelling each other out completely makes any area valid.
+
+    'layer' is an optional function, called with a target and the pieces
+    grouped by type, which returns whether the pieces can be layered to leave
+    that target (or None if solving is stopped).  It is used when the result
+    isn't already known, instead of layering just these pieces.
+    """
 
-    A further complication is that yellow tetris pieces can overlap and then be
-    cancelled out by a blue tetris piece.
+    yellow_count = sum(piece.count for piece in pieces if not piece.negative)
+    blue_count = sum(piece.count for piece in pieces if piece.negative)
+    targets = []
+    if yellow_count == blue_count:
+      targets.append(0)
+    if yellow_count - blue_count == bin(area).count("1"):
+      targets.append(area)
+
+    # Identical pieces are interchangeable, so group them together and
+    # describe the pieces by the sorted description of each piece (its shape,
+    # whether it can be rotated and its colour), wherever it is
+    piece_types = {}
+    for piece in pieces:
+      piece_types.setdefault(self.piece_types[piece], []).append(piece)
+    key = tuple(sorted(self.piece_types[piece] for piece in pieces))
+
+    # The results for this combination of pieces, as sorted lists of the
+    # targets which can and can't be left and their approximate size in bytes,
+    # moved to the end as the most recently used
+    results = self.blue_tetris_areas.pop(key, None)
+    if results is None:
+      results = [[], [], 0]
+    self.blue_tetris_areas[key] = results
+
+    def contains(sorted_targets, target):
+      n = bisect_left(sorted_targets, target)
+      return n < len(sorted_targets) and sorted_targets[n] == target
+
+    for target in targets:
+      if contains(results[0], target):
+        return True
+      if contains(results[1], target):
+        continue
 
-    So, here, we try every possible combination of tetris pieces which will fit
-    onto the board and store all valid areas.
+      # Check if we've already worked out this combination of pieces and
+      # target in another process or run (if there is a tetris cache)
+      cache_key = "%dx%d %r %d" % (self.width, self.height, key, target)
+      layered = None
+      if self.tetris_cache is not None:
+        layered = self.tetris_cache.get(cache_key)
+      if layered is None:
+        if layer is None:
+          left_out = self.layer_tetris(target, piece_types.values())
+          layered = None if left_out is None else bool(left_out)
+        else:
+          layered = layer(target, piece_types)
+        if layered is None:
+          # Solving has been stopped
+          return False
+        if self.tetris_cache is not None:
+          self.tetris_cache.put(cache_key, layered)
+
+      insort(results[0] if layered else results[1], target)
+      # The target itself and a reference to it in the list
+      size = sys.getsizeof(target) + 8
+      results[2] += size
+      self.blue_tetris_bytes += size
+      while self.blue_tetris_bytes > self.blue_tetris_cache_size and \
+            len(self.blue_tetris_areas) > 1:
+        forgotten = self.blue_tetris_areas.popitem(last=False)[1]
+        self.blue_tetris_bytes -= forgotten[2]
+
+      if layered:
+        return True
+
+    # Invalid area
+    return False
+
+
+  def layer_tetris(self, target, piece_types, max_left_out=0):
+    """
+    Find the ways the given pieces can be layered on the board to leave
+    exactly the target (a bitmask of cells)
+    - yellow pieces add one to the cell count
+    - blue pieces subtract one from the cell count
+    - only placements entirely on the board are considered
+    - up to 'max_left_out' of the pieces may be left out altogether
+    Return the set of how many of each type of piece are left out, as tuples,
+    for every way found (so an empty set if there is none), or None if solving
+    is stopped before finding out.  If no pieces may be left out, the search
+    stops at the first way found.
+
+    'piece_types' is a list of lists of identical pieces.
+
+    Cells are decided in order.  Every placement is anchored at its first cell
+    and, once all pieces anchored at a cell have been placed, nothing else can
+    change that cell's count so it must match the target.  Identical pieces
+    anchored at the same cell are only placed in one order.
+
+    Pieces are placed and taken away again on a single list of differences
+    between each cell's count and the target, and the number of cells which
+    differ is kept up to date, so there is nothing to copy or scan.
+
+    Moving on to the next cell, what can still be found depends only on the
+    cell, the pieces not yet placed and the differences from that cell onwards,
+    however they came about, so the result is remembered and shared by every
+    layering which reaches the same point.  With pieces left out, every subset
+    of the pieces is answered by the one search.
     """
 
-    # Make the set of pieces sorted and immutable so we can store it and search
-    # for it in a set
-    pieces = tuple(sorted(pieces))
+    cell_count = self.width * self.height
+    differences = [-((target >> cell) & 1) for cell in range(cell_count)]
 
-    def recurse(original_area, pieces, n=0):
+    # For each type of piece, whether it adds or subtracts, the placements
+    # anchored at each cell and how many are still to be placed
+    signs = [-1 if same_pieces[0].negative else 1
+             for same_pieces in piece_types]
+    anchored = [self.anchored_placements[same_pieces[0]]
+                for same_pieces in piece_types]
+    remaining = [len(same_pieces) for same_pieces in piece_types]
+
+    # What has been found from the start of each cell reached, keyed by the
+    # cell, the pieces still to be placed and the differences from the cell on
+    finished = {}
+
+    stopped = self.stop_check()
+
+    def search(cell, first_type, first_placement, yellows, blues, mismatches):
       """
-      Layer the pieces over the board in every combination
-      - yellow pieces add one to the cell count
-      - blue pieces subtract one from the cell count
-      - if any cell falls outside the puzzle area, it is not a valid
-        combination
-      For every combination tested:
-      - if the area contains only zeroes and ones, the ones form a valid
-        area shape
-      - if the area contains only zeroes, this combination of pieces is always
-        valid (because blues and yellows cancel each other out).
-
-      Only evaluate the area if it contains all given pieces and they all fit.
+      Place the remaining pieces, 'yellows' and 'blues' of them, from 'cell'
+      onwards.  Pieces anchored at 'cell' are placed in order of type then
+      placement, starting with 'first_type' and 'first_placement'.
+      'mismatches' is the number of cells which don't match the target.
+      Return the set of pieces left out (see above) for every way found.
       """
 
-      # Find remaining number of yellow and blue pieces (not including this one)
-      remaining_yellows = 0
-      remaining_blues = 0
-      for p in range(n + 1, len(pieces)):
-        if pieces[p].negative:
-          remaining_blues += 1
+      found = set()
+      if not mismatches and yellows + blues <= max_left_out:
+        # The target is left, with any remaining pieces left out
+        found.add(tuple(remaining))
+        if not max_left_out:
+          return found
+
+      if (not yellows and not blues) or cell == cell_count:
+        return found
+
+      for piece_type in range(first_type, len(signs)):
+        if not remaining[piece_type]:
+          continue
+        sign = signs[piece_type]
+        remaining[piece_type] -= 1
+        if sign > 0:
+          yellows -= 1
         else:
-          remaining_yellows += 1
-
-      for rotation in pieces[n].shapes:
-        for x in range(self.width):
-          for y in range(self.height):
-            self.yield_check()
-            if not self.keep_solving:
-              return
-            area = original_area.copy()
-            cells = []
-            fits = True
-            for px, py in rotation:
-              cell = (x + px, y + py)
-              if cell not in area:
-                fits = False
-                break
-              cells.append(cell)
-
-            if fits:
-              valid = True
-
-              # This piece fits, update area count
-              for cell in cells:
-                if pieces[n].negative:
-                  area[cell] -= 1
-                else:
-                  area[cell] += 1
-
-                # If there are not enough pieces left to ever get this cell back
-                # to being valid, area is invalid
-                if area[cell] != 0 \
-                  and (remaining_yellows < -(area[cell] - 1) \
-                       or remaining_blues < area[cell] - 1):
-                  valid = False
-                  break
-
-              if valid:
-                if n == len(pieces) - 1:
-                  # All pieces fit into the area, see if this is a valid
-                  # area and capture the shape
-                  valid_area = []
-                  for cell, count in area.iteritems():
-                    if count < 0 or count > 1:
-                      # This cannot be a valid area
-                      valid = False
-                      break
-                    if count == 1:
-                      valid_area.append(cell)
-                  if valid:
-                    self.blue_tetris_areas[pieces].add(frozenset(valid_area))
-                else:
-                  # There are still more pieces to go, recurse
-                  recurse(area.copy(), pieces, n + 1)
-
-    # Check if we've already worked out this combination of pieces
-    if pieces not in self.blue_tetris_areas:
-      # Add this combination of pieces to the map
-      self.blue_tetris_areas[pieces] = set()
-
-      # Build an area the size of the board, with all cells initially set to
-      # 0
-      board_area = {(x, y): 0 for x in range(self.width) \
-                        for y in range(self.height)}
-
-      recurse(board_area, pieces)
-
-    if area in self.blue_tetris_areas[pieces] or \
-         frozenset([]) in self.blue_tetris_areas[pieces]:
-      # An empty set means yellow and blue cancel each other out
-      # completely so any area is valid
-      return True
-    else:
-      # Invalid area
+          blues -= 1
+
+        placements = anchored[piece_type][cell]
+        start = first_placement if piece_type == first_type else 0
+        for n in range(start, len(placements)):
+          if stopped():
+            remaining[piece_type] += 1
+            return None
+
+          # Place the piece
+          placed_cells = placements[n][1]
+          placed_mismatches = mismatches
+          for placed_cell in placed_cells:
+            difference = differences[placed_cell] + sign
+
+            # If there are not enough pieces left to ever get this cell back
+            # to the target, this placement is invalid
+            if difference > blues or -difference > yellows:
+              placed_found = found
+              break
+
+            differences[placed_cell] = difference
+            if not difference:
+              placed_mismatches -= 1
+            elif difference == sign:
+              placed_mismatches += 1
+          else:
+            placed_found = search(cell, piece_type, n, yellows, blues,
+                                  placed_mismatches)
+            placed_cell = None
+
+          # Take the piece away again, as far as it was placed
+          for undo_cell in placed_cells:
+            if undo_cell == placed_cell:
+              break
+            differences[undo_cell] -= sign
+
+          if placed_found is None:
+            remaining[piece_type] += 1
+            return None
+          if placed_found is not found:
+            found |= placed_found
+            if found and not max_left_out:
+              remaining[piece_type] += 1
+              return found
+
+        remaining[piece_type] += 1
+        if sign > 0:
+          yellows += 1
+        else:
+          blues += 1
+
+      # No more pieces anchored here, so this cell is finished
+      if differences[cell]:
+        return found
+
+      key = (cell, tuple(remaining), tuple(differences[cell + 1:]))
+      later = finished.get(key)
+      if later is None:
+        later = search(cell + 1, 0, 0, yellows, blues, mismatches)
+        if later is None:
+          return None
+        finished[key] = later
+
+      return found | later
+
+    yellows = sum(len(same_pieces) for same_pieces in piece_types
+                  if not same_pieces[0].negative)
+    blues = sum(len(same_pieces) for same_pieces in piece_types
+                if same_pieces[0].negative)
+
+    return search(0, 0, 0, yellows, blues, bin(target).count("1"))
+
+
+  def yellow_tetris_subsets(self, area, piece_types, max_left_out):
+    """
+    Find the subsets of the given yellow tetris pieces, leaving out at most
+    'max_left_out' of them, which exactly fit into the given area (a bitmask
+    of cells).  Return the set of how many of each type of piece are left out,
+    as tuples, for every subset which fits (so an empty set if there is none),
+    or None if solving is stopped before finding out.
+
+    'piece_types' is a list of lists of identical pieces.
+
+    Rather than trying to fit each subset separately, one search finds them
+    all.  The first cell of the area which isn't covered yet is always covered
+    next, by a placement anchored at that cell.  Identical pieces are only
+    counted, so each way of fitting them is only found once rather than once
+    for every order of the pieces.
+
+    What can still be found depends only on the cells not yet covered and the
+    pieces not yet placed, so the result is remembered and shared by every
+    way of reaching the same point.  A branch is abandoned as soon as the
+    cells left are too few to take enough of the remaining pieces, even the
+    smallest, to leave out no more than 'max_left_out'.
+    """
+
+    counts = [same_pieces[0].count for same_pieces in piece_types]
+    anchored = [self.anchored_placements[same_pieces[0]]
+                for same_pieces in piece_types]
+    remaining = [len(same_pieces) for same_pieces in piece_types]
+    smallest_first = sorted(range(len(piece_types)), key=counts.__getitem__)
+
+    # What has been found from each point reached, keyed by the cells not yet
+    # covered and the pieces still to be placed
+    finished = {}
+
+    stopped = self.stop_check()
+
+    def search(uncovered):
+      """
+      Cover the 'uncovered' cells with some of the remaining pieces.  Return
+      the set of pieces left out (see above) for every way found.
+      """
+
+      key = (uncovered, tuple(remaining))
+      found = finished.get(key)
+      if found is not None:
+        return found
+
+      # Fit as many of the remaining pieces as possible into the cells left,
+      # smallest first, to find the fewest which must be left out
+      cells_left = bin(uncovered).count("1")
+      left_out = 0
+      for piece_type in smallest_first:
+        fitted = min(remaining[piece_type], cells_left // counts[piece_type])
+        cells_left -= fitted * counts[piece_type]
+        left_out += remaining[piece_type] - fitted
+
+      if left_out > max_left_out:
+        found = set()
+
+      elif not uncovered:
+        found = set([tuple(remaining)])
+
+      else:
+        found = set()
+        cell = (uncovered & -uncovered).bit_length() - 1
+        for piece_type in range(len(piece_types)):
+          if not remaining[piece_type]:
+            continue
+
+          remaining[piece_type] -= 1
+          for mask, cells in anchored[piece_type][cell]:
+            if mask & ~uncovered:
+              continue
+
+            if stopped():
+              remaining[piece_type] += 1
+              return None
+
+            placed_found = search(uncovered ^ mask)
+            if placed_found is None:
+              remaining[piece_type] += 1
+              return None
+            found |= placed_found
+          remaining[piece_type] += 1
+
+      finished[key] = found
+      return found
+
+    return search(area)
+
+
+  def tetris_combination_valid(self, area, pieces, layer=None):
+    """
+    Return True if the given combination of tetris pieces (all of the pieces
+    in an area which aren't eliminated) is valid in the given area.  'layer'
+    is passed on to solve_blue_tetris().
+    """
+
+    # Count total number of blue and yellow cells
+    blue_count = sum(piece.count for piece in pieces if piece.negative)
+    yellow_count = sum(piece.count for piece in pieces if not piece.negative)
+
+    if blue_count == 0:
+      # Just yellow pieces
+
+      if yellow_count == 0:
+        # No yellow or blue pieces, i.e. there are no tetris pieces in this
+        # area
+        return True
+
+      # Make sure the number of tetris cells equals the size of the area
+      if yellow_count != bin(area).count("1"):
+        return False
+
+      if not self.yellow_tetris_possible(area, pieces):
+        return False
+
+      return self.solve_yellow_tetris(area, pieces)
+
+    if yellow_count == 0:
+      # Just blue pieces, cannot solve
+      return False
+
+    # Blue and yellow pieces
+
+    # Make sure there are at least as many yellow cells as blue
+    if blue_count > yellow_count:
       return False
 
+    return self.solve_blue_tetris(area, pieces, layer)
+
 
-  def solve_squares_and_stars(self, area, fixed, remaining_errors):
+  def tetris_combinations(self, area, tetris_cells, max_errors):
     """
-    Look through all possible valid combinations of squares and stars, taking
-    fixed pieces (triangles, yellow tetris and blue tetris pieces) into account.
+    Yield the combinations of the tetris pieces in the given cells which are
+    valid in the given area, when up to 'max_errors' of them may be
+    eliminated, as tuples of the cells of the pieces which are kept.  They are
+    yielded in the same order as trying each combination from
+    itertools.combinations() in turn, fewest eliminated first.
+
+    Combinations of just yellow pieces, with some eliminated, are all found in
+    one search the first time one is needed.  So are combinations with blue
+    pieces, for each target area, the first time one isn't already known.
+    """
+
+    pieces = [self.cells[y][x].tetris for x, y in tetris_cells]
+    max_errors = min(len(pieces), max_errors)
+    area_size = bin(area).count("1")
+
+    # Once a combination with some pieces eliminated is needed, all the pieces
+    # grouped by type, the number of each piece's type and how many there are
+    # of each.  Combinations with the same number of each type are
+    # interchangeable, so each is only checked once.  How many of each type
+    # of yellow piece can be left out when fitting just the yellow pieces is
+    # found the first time it's needed, as is how many of each type can be
+    # left out when layering all the pieces for each target.
+    piece_types = None
+    yellow_subsets = None
+    blue_results = {}
+    blue_layerings = {}
+
+    def layer(target, kept_types):
+      """Layer a combination with some pieces eliminated (see above)."""
+
+      if target not in blue_layerings:
+        left_out = self.layer_tetris(target, piece_types.values(), max_errors)
+        if left_out is None:
+          return None
+        blue_layerings[target] = left_out
+
+      return tuple(len(same_pieces) - len(kept_types.get(piece_type, ()))
+                   for piece_type, same_pieces in piece_types.iteritems()) \
+             in blue_layerings[target]
+
+    for tetris_errors in range(max_errors + 1):
+      for kept in combinations(range(len(pieces)),
+                               len(pieces) - tetris_errors):
+        kept_pieces = [pieces[n] for n in kept]
+
+        if not tetris_errors:
+          valid = self.tetris_combination_valid(area, kept_pieces)
+
+        else:
+          just_yellow = kept and \
+                        not any(piece.negative for piece in kept_pieces)
+          if just_yellow and \
+             sum(piece.count for piece in kept_pieces) != area_size:
+            # Just yellow pieces, which must fit exactly into the area
+            continue
+
+          if piece_types is None:
+            piece_types = OrderedDict()
+            for piece in pieces:
+              piece_types.setdefault(self.piece_types[piece], []).append(piece)
+            type_numbers = dict((piece_type, n)
+                                for n, piece_type in enumerate(piece_types))
+            piece_type_numbers = [type_numbers[self.piece_types[piece]]
+                                  for piece in pieces]
+            type_counts = [len(same_pieces)
+                           for same_pieces in piece_types.itervalues()]
+            yellow_types = [n for n, same_pieces
+                            in enumerate(piece_types.itervalues())
+                            if not same_pieces[0].negative]
+
+          left_out = type_counts[:]
+          for n in kept:
+            left_out[piece_type_numbers[n]] -= 1
+          left_out = tuple(left_out)
+
+          if just_yellow:
+            if yellow_subsets is None:
+              # Every blue piece must be left out too
+              blue_count = sum(piece.negative for piece in pieces)
+              yellow_subsets = self.yellow_tetris_subsets(
+                area, [piece_types.values()[n] for n in yellow_types],
+                max_errors - blue_count)
+              if yellow_subsets is None:
+                # Solving has been stopped
+                yellow_subsets = set()
+            valid = tuple(left_out[n] for n in yellow_types) in yellow_subsets
+
+          else:
+            valid = blue_results.get(left_out)
+            if valid is None:
+              valid = self.tetris_combination_valid(area, kept_pieces, layer)
+              blue_results[left_out] = valid
+
+        if valid:
+          yield tuple(tetris_cells[n] for n in kept)
+
+
+  def solve_squares_and_stars(self, square_cells, star_cells, fixed,
+                              remaining_errors):
+    """
+    Look through all possible valid combinations of the squares and stars in
+    an area, given lists of their cells, taking fixed pieces (triangles,
+    yellow tetris and blue tetris pieces) into account.
     """
 
     # Keep track of which colours need to be considered
@@ -389,15 +809,16 @@ class Puzzle(object):
     # Count the number of stars and squares in this area and store by colour
     stars = defaultdict(int)
     squares = defaultdict(int)
-    for x, y in area:
-      cell = self.cells[y][x]
-      if cell.is_square():
-        squares[cell.square.colour] += 1
-        colours.add(cell.square.colour)
-      elif cell.is_star() and (x, y) not in self.removed_pieces:
-        # Do not consider stars which have already been removed
-        stars[cell.star.colour] += 1
-        colours.add(cell.star.colour)
+    for cell in square_cells:
+      colour = self.cell_colours[self.cell_bits[cell]]
+      squares[colour] += 1
+      colours.add(colour)
+    for cell in star_cells:
+      # Do not consider stars which have already been removed
+      if cell not in self.removed_pieces:
+        colour = self.cell_colours[self.cell_bits[cell]]
+        stars[colour] += 1
+        colours.add(colour)
 
     if not stars and not squares:
       return True, set()
@@ -463,15 +884,16 @@ class Puzzle(object):
     # We have a count of how many of which colour of stars and squares can be
     # eliminated, so we need to find the cells of appropriate stars and squares
     # in the area
-    for x, y in area:
-      cell = self.cells[y][x]
-      if cell.is_square() and removed_square_count[cell.square.colour] > 0:
-        removed_stars_squares.add((x, y))
-        removed_square_count[cell.square.colour] -= 1
-      if cell.is_star() and removed_star_count[cell.star.colour] > 0 \
-        and (x, y) not in self.removed_pieces:
-        removed_stars_squares.add((x, y))
-        removed_star_count[cell.star.colour] -= 1
+    for cell in square_cells:
+      colour = self.cell_colours[self.cell_bits[cell]]
+      if removed_square_count[colour] > 0:
+        removed_stars_squares.add(cell)
+        removed_square_count[colour] -= 1
+    for cell in star_cells:
+      colour = self.cell_colours[self.cell_bits[cell]]
+      if removed_star_count[colour] > 0 and cell not in self.removed_pieces:
+        removed_stars_squares.add(cell)
+        removed_star_count[colour] -= 1
 
     return True, removed_stars_squares
 
@@ -503,48 +925,24 @@ class Puzzle(object):
     return None
 
 
-  def validate_path(self, path, symmetry_path):
-    """See if the given path is a valid solution."""
-
-    invalid_areas = []
-
-    # Step 1 - the last point in the path must be an end node
-    if path[-1] not in self.end_nodes:
-      return False, invalid_areas
-
-    # Make this path available for observers to pick up
-    self.path = path
-
-    # Store the vertical and horizontal edges of the path
-    path_v_edges = set()
-    path_h_edges = set()
-    x, y = path[0]
-    for next_x, next_y in path[1:]:
-      if x == next_x:
-        path_h_edges.add((x, min(y, next_y)))
-      elif y == next_y:
-        path_v_edges.add((min(x, next_x), y))
+  def path_bits(self, path, symmetry_path):
+    """
+    Return bitmasks of the nodes and edges of the path and its symmetry path.
+    """
 
-      x = next_x
-      y = next_y
+    node_bits = 0
+    edge_bits = 0
+    for current_path in (path, symmetry_path):
+      for n, node in enumerate(current_path):
+        node_bits |= self.node_bits[node]
+        if n:
+          edge_bits |= self.edge_bits[(current_path[n - 1], node)]
 
-    # Store the vertical and horizontal edges of the symmetrical path
-    if self.symmetry != SymmetryType.NONE:
-      x, y = symmetry_path[0]
-      for next_x, next_y in symmetry_path[1:]:
-        if x == next_x:
-          path_h_edges.add((x, min(y, next_y)))
-        elif y == next_y:
-          path_v_edges.add((min(x, next_x), y))
+    return node_bits, edge_bits
 
-        x = next_x
-        y = next_y
 
-    # Step 2 - work out which areas the path defines to help solve many of the
-    # other cell types
-    # Note, we cannot solve triangles or hexagons yet as they may depend on
-    # elimination marks
-    self.areas = self.define_areas(path_h_edges, path_v_edges)
+  def clear_removed(self):
+    """Forget which pieces, nodes and edges were removed by elimination marks."""
 
     # Keep a set of which pieces have been removed by elimination marks
     self.removed_pieces = set()
@@ -553,209 +951,261 @@ class Puzzle(object):
     self.removed_v_edges = set()
     self.removed_h_edges = set()
 
-    for area in self.areas:
-      area_valid = True
-
-      # Number of errors allowed, i.e. how many eliminations marks there are
-      allowed_errors = 0
-      for y in self.y:
-        if y in area:
-          # Record elimination marks as removed pieces
-          self.removed_pieces.add(y)
-          allowed_errors += 1
-
-      # Count the total number of errors found in this area
-      total_errors = 0
-
-      # Number of coloured objects (which are not in error)
-      colour_count = defaultdict(int)
-
-      # Step 3 - triangles
-      for triangle in self.triangles:
-        if triangle in area:
-          x, y = triangle
-          # Count the edges around this triangle
-          edge_count = 0
-          if (x, y) in path_h_edges:
-            edge_count += 1
-          if (x, y) in path_v_edges:
-            edge_count += 1
-          if (x + 1, y) in path_h_edges:
-            edge_count += 1
-          if (x, y + 1) in path_v_edges:
-            edge_count += 1
-          # Edge count must equal the number of triangles in the cell
-          if edge_count != self.cells[y][x].triangle.number:
-            total_errors += 1
-            self.removed_pieces.add(triangle)
-          else:
-            colour_count[Colour.ORANGE] += 1
 
-          if total_errors > allowed_errors:
-            area_valid = False
-            break
+  def validate_area(self, area, path_nodes, path_edges):
+    """
+    See if a single area (a bitmask of cells) defined by a path is valid.
+    'path_nodes' and 'path_edges' are bitmasks of the nodes and edges of the
+    path and its symmetry path.
+    """
 
-      if not area_valid:
-        invalid_areas.append(area)
+    area_valid = True
+
+    # Number of errors allowed, i.e. how many eliminations marks there are
+    allowed_errors = 0
+
+    # Sort out the cells of the area by type in a single pass, and collect the
+    # nodes and edges around them
+    triangles = []
+    squares = []
+    stars = []
+    tetris_cells = []
+    area_nodes = 0
+    area_edges = 0
+    cells = area
+    while cells:
+      bit = cells & -cells
+      cells ^= bit
+      area_nodes |= self.cell_node_masks[bit]
+      area_edges |= self.cell_edge_masks[bit]
+
+      cell_type = self.cell_types[bit]
+      if cell_type == CellType.NONE:
         continue
-
-      # Store the nodes, vertical and horizontal edges which are within the
-      # area, i.e. not on the path
-      area_nodes = set()
-      area_v_edges = set()
-      area_h_edges = set()
-      for x, y in area:
-        for node in [(x, y), (x + 1, y), (x, y + 1), (x + 1, y + 1)]:
-          if node not in path + symmetry_path:
-            area_nodes.add(node)
-
-        for v_edge in [(x, y), (x, y + 1)]:
-          if v_edge not in path_v_edges:
-            area_v_edges.add(v_edge)
-
-        for h_edge in [(x, y), (x + 1, y)]:
-          if h_edge not in path_h_edges:
-            area_h_edges.add(h_edge)
-
-      # Step 4 - hexagons within the area (not on the path) are errors
-      for hexagon_node in self.hexagon_nodes:
-        if hexagon_node in area_nodes:
-          total_errors += 1
-          self.removed_nodes.add(hexagon_node)
-      for hexagon_v_edge in self.hexagon_v_edges:
-        if hexagon_v_edge in area_v_edges:
-          total_errors += 1
-          self.removed_v_edges.add(hexagon_v_edge)
-      for hexagon_h_edge in self.hexagon_h_edges:
-        if hexagon_h_edge in area_h_edges:
-          total_errors += 1
-          self.removed_h_edges.add(hexagon_h_edge)
+      cell = self.bit_cells[bit]
+      if cell_type == CellType.TRIANGLE:
+        triangles.append((cell, bit))
+      elif cell_type == CellType.SQUARE:
+        squares.append(cell)
+      elif cell_type == CellType.STAR:
+        stars.append(cell)
+      elif cell_type == CellType.TETRIS:
+        tetris_cells.append(cell)
+      elif cell_type == CellType.Y:
+        # Record elimination marks as removed pieces
+        self.removed_pieces.add(cell)
+        allowed_errors += 1
+
+    # Count the total number of errors found in this area
+    total_errors = 0
+
+    # Number of coloured objects (which are not in error)
+    colour_count = defaultdict(int)
+
+    # Step 3 - triangles
+    for triangle, bit in triangles:
+      # Count the edges around this triangle
+      edge_count = bin(path_edges & self.cell_edge_masks[bit]).count("1")
+      # Edge count must equal the number of triangles in the cell
+      if edge_count != self.cell_numbers[bit]:
+        total_errors += 1
+        self.removed_pieces.add(triangle)
+      else:
+        colour_count[Colour.ORANGE] += 1
 
       if total_errors > allowed_errors:
-        invalid_areas.append(area)
-        continue
+        area_valid = False
+        break
 
-      # Step 5 - eliminate stars if there are more than 2 of a given colour
-      if self.stars:
-        colour_map = defaultdict(int)
-        for x, y in [cell for cell in area if cell in self.stars]:
-          star = self.cells[y][x].star
-          if colour_map[star.colour] > 1:
-            # We've already counted 2 stars of this colour, eliminate extras
-            total_errors += 1
-            self.removed_pieces.add((x, y))
-          colour_map[star.colour] += 1
+    if not area_valid:
+      return False
 
-      if total_errors > allowed_errors:
-        invalid_areas.append(area)
-        continue
+    # Step 4 - hexagons within the area (not on the path) are errors
+    hexagon_nodes = area_nodes & ~path_nodes & self.hexagon_node_mask
+    hexagon_edges = area_edges & ~path_edges & self.hexagon_edges
+    while hexagon_nodes:
+      bit = hexagon_nodes & -hexagon_nodes
+      hexagon_nodes ^= bit
+      total_errors += 1
+      self.removed_nodes.add(self.bit_nodes[bit])
+    while hexagon_edges:
+      bit = hexagon_edges & -hexagon_edges
+      hexagon_edges ^= bit
+      total_errors += 1
+      if bit in self.bit_v_edges:
+        self.removed_v_edges.add(self.bit_v_edges[bit])
+      else:
+        self.removed_h_edges.add(self.bit_h_edges[bit])
+
+    if total_errors > allowed_errors:
+      return False
 
-      # Step 6 - tetris
-      # We must work out tetris now because it's not possible to know which
-      # yellow and blue squares and stars can be eliminated until we know which
-      # combinations of tetris pieces may be removed
-
-      # Find cells in this area containing tetris pieces
-      tetris_cells = [cell for cell in area if cell in self.tetris]
-      # Iterate over all possible combinations of tetris pieces, given that
-      # zero or more may be eliminated
-      tetris_solved = False
-      # Consider removing from 0 to number of tetris pieces,
-      # or from 0 to number of remaining elimination marks, whichever is smaller
-      for tetris_errors in range(min(len(tetris_cells),
-                                     allowed_errors - total_errors) + 1):
-        for tetris_cells_combination in \
-          combinations(tetris_cells, len(tetris_cells) - tetris_errors):
-          # tetris_cells_combination is now all possible combinations of
-          # tetris pieces given that tetris_errors have been eliminated
-
-          # Remove previous attempts
-          self.removed_pieces.difference_update(set(tetris_cells))
-
-          # Collect tetris pieces and count total number of blue and yellow
-          # cells
-          blue_count = 0
-          yellow_count = 0
-          pieces = set()
-          for x, y in tetris_cells_combination:
-            piece = self.cells[y][x].tetris
-            if piece.negative:
-              blue_count += piece.count
-            else:
-              yellow_count += piece.count
-            pieces.add(piece)
-
-          valid_combination = True
-          if blue_count == 0:
-            # Just yellow pieces
-
-            if yellow_count == 0:
-              # No yellow or blue pieces, i.e. there are no tetris pieces in
-              # this area
-              pass
-
-            # Make sure the number of tetris cells equals the size of the area
-            elif yellow_count != len(area):
-              valid_combination = False
-
-            elif not self.solve_yellow_tetris(area, pieces):
-              valid_combination = False
+    # Step 5 - eliminate stars if there are more than 2 of a given colour
+    colour_map = defaultdict(int)
+    for star in stars:
+      colour = self.cell_colours[self.cell_bits[star]]
+      if colour_map[colour] > 1:
+        # We've already counted 2 stars of this colour, eliminate extras
+        total_errors += 1
+        self.removed_pieces.add(star)
+      colour_map[colour] += 1
+
+    if total_errors > allowed_errors:
+      return False
 
-          else:
-            if yellow_count == 0:
-              # Just blue pieces, cannot solve
-              valid_combination = False
+    # Step 6 - tetris
+    # We must work out tetris now because it's not possible to know which
+    # yellow and blue squares and stars can be eliminated until we know which
+    # combinations of tetris pieces may be removed
+
+    # Iterate over all valid combinations of tetris pieces, given that zero or
+    # more may be eliminated (up to the number of remaining elimination marks)
+    tetris_solved = False
+    for tetris_cells_combination in \
+      self.tetris_combinations(area, tetris_cells,
+                               allowed_errors - total_errors):
+      tetris_errors = len(tetris_cells) - len(tetris_cells_combination)
+
+      # Remove previous attempts
+      self.removed_pieces.difference_update(set(tetris_cells))
+
+      tetris_solved = True
+      # This combination of tetris pieces is valid (or there are no tetris
+      # pieces)
+
+      # Record how many blue and yellow pieces must remain
+      colour_count[Colour.BLUE] = 0
+      colour_count[Colour.YELLOW] = 0
+      for x, y in tetris_cells_combination:
+        if self.cells[y][x].tetris.negative:
+          colour_count[Colour.BLUE] += 1
+        else:
+          colour_count[Colour.YELLOW] += 1
 
-            # Blue and yellow pieces
+      remaining_errors = allowed_errors - (total_errors + tetris_errors)
 
-            # Make sure there are at least as many yellow cells as blue
-            elif blue_count > yellow_count:
-              valid_combination = False
+      # Step 7 - solve squares and stars which, if present, must use up all
+      # remaining elimination marks
+      valid, removed_squares_stars = \
+        self.solve_squares_and_stars(squares, stars, colour_count,
+          remaining_errors)
 
-            elif not self.solve_blue_tetris(area, pieces):
-              valid_combination = False
+      if not valid or len(removed_squares_stars) != remaining_errors:
+        area_valid = False
+        break
 
-          if not valid_combination:
-            continue
+      # Record tetris pieces, squares and stars which were removed
+      self.removed_pieces.update(\
+        set(tetris_cells) - set(tetris_cells_combination),
+        removed_squares_stars)
 
-          tetris_solved = True
-          # This combination of tetris pieces is valid (or there are no tetris
-          # pieces)
-
-          # Record how many blue and yellow pieces must remain
-          colour_count[Colour.BLUE] = 0
-          colour_count[Colour.YELLOW] = 0
-          for x, y in tetris_cells_combination:
-            if self.cells[y][x].tetris.negative:
-              colour_count[Colour.BLUE] += 1
-            else:
-              colour_count[Colour.YELLOW] += 1
-
-          remaining_errors = allowed_errors - (total_errors + tetris_errors)
-
-          # Step 7 - solve squares and stars which, if present, must use up all
-          # remaining elimination marks
-          valid, removed_squares_stars = \
-            self.solve_squares_and_stars(area, colour_count,
-              remaining_errors)
-
-          if not valid or len(removed_squares_stars) != remaining_errors:
-            area_valid = False
-            break
+    # No valid solutions
+    if not area_valid or not tetris_solved:
+      return False
 
-          # Record tetris pieces, squares and stars which were removed
-          self.removed_pieces.update(\
-            set(tetris_cells) - set(tetris_cells_combination),
-            removed_squares_stars)
+    return True
 
-        if not area_valid:
-          break
 
-      # No valid solutions
-      if not area_valid or not tetris_solved:
-        invalid_areas.append(area)
-        continue
+  def area_signature(self, area, path_node_bits, path_edge_bits):
+    """
+    Return a signature which decides whether an area (a bitmask of cells) is
+    valid: the area's cells along with the path edges around them which
+    matter to triangles and hexagons, and the hexagon nodes around them which
+    are on the path.
+    """
+
+    edges = 0
+    nodes = 0
+    cells = area
+    while cells:
+      bit = cells & -cells
+      edges |= self.cell_edge_masks[bit]
+      nodes |= self.cell_node_masks[bit]
+      cells ^= bit
+
+    return (area, path_edge_bits & edges & self.signature_edges,
+            path_node_bits & nodes & self.hexagon_node_mask)
+
+
+  def area_cost(self, area):
+    """
+    Return a rough guide to how long an area (a bitmask of cells) takes to
+    validate, for sorting areas.  Tetris pieces take the longest, blue pieces
+    most of all, followed by elimination marks.
+    """
+
+    return (bin(area & self.blue_tetris_mask).count("1"),
+            bin(area & self.tetris_mask).count("1"),
+            bin(area & self.y_mask).count("1"))
+
+
+  def cached_validate_area(self, area, key, path_nodes, path_edges):
+    """
+    See if a single area is valid, as validate_area(), remembering the result.
+    'key' is the area's area_signature().
+    """
+
+    result = self.area_cache.pop(key, None)
+
+    if result is None:
+      self.area_cache_misses += 1
+
+      # Validate with nothing removed so that only what is removed from this
+      # area is recorded
+      removed = (self.removed_pieces, self.removed_nodes,
+                 self.removed_v_edges, self.removed_h_edges)
+      self.clear_removed()
+      valid = self.validate_area(area, path_nodes, path_edges)
+      area_removed = None
+      if valid and (self.removed_pieces or self.removed_nodes or
+                    self.removed_v_edges or self.removed_h_edges):
+        area_removed = (self.removed_pieces, self.removed_nodes,
+                        self.removed_v_edges, self.removed_h_edges)
+      self.removed_pieces, self.removed_nodes, \
+        self.removed_v_edges, self.removed_h_edges = removed
+
+      # The key, the result and roughly what the cache needs to hold them
+      size = sys.getsizeof(key) + sum(sys.getsizeof(bits) for bits in key) + \
+             sys.getsizeof((valid, area_removed, 0)) + 128
+      if area_removed:
+        size += sys.getsizeof(area_removed) + \
+                sum(sys.getsizeof(removed_set) for removed_set in area_removed)
+      result = (valid, area_removed, size)
+
+      # Forget the least recently used areas to make room
+      self.area_cache_bytes += size
+      while self.area_cache_bytes > self.area_cache_size and self.area_cache:
+        self.area_cache_bytes -= self.area_cache.popitem(last=False)[1][2]
+
+    else:
+      self.area_cache_hits += 1
+
+    # Store as the most recently used area
+    self.area_cache[key] = result
+
+    valid, area_removed = result[:2]
+    if area_removed:
+      self.removed_pieces.update(area_removed[0])
+      self.removed_nodes.update(area_removed[1])
+      self.removed_v_edges.update(area_removed[2])
+      self.removed_h_edges.update(area_removed[3])
+
+    return valid
 
+
+  def validate_path(self, path, symmetry_path):
+    """
+    See if the given path is a valid solution.  If it isn't, any invalid areas
+    are returned as bitmasks of cells.
+    """
+
+    invalid_areas = []
+
+    # Step 1 - the last point in the path must be an end node
+    if path[-1] not in self.end_nodes:
+      return False, invalid_areas
+
+    invalid_areas = list(self.invalid_areas(path, symmetry_path))
     if invalid_areas:
       return False, invalid_areas
 
@@ -763,146 +1213,575 @@ class Puzzle(object):
     return True, None
 
 
+  def broken_cells(self, path_nodes, path_edges):
+    """
+    Return a bitmask of the cells next to a hexagon which isn't on the path,
+    or with a triangle which doesn't have the right number of path edges
+    around it.  'path_nodes' and 'path_edges' are bitmasks of the nodes and
+    edges of the path and its symmetry path.
+    """
+
+    cells = 0
+
+    hexagon_nodes = self.hexagon_node_mask & ~path_nodes
+    while hexagon_nodes:
+      bit = hexagon_nodes & -hexagon_nodes
+      hexagon_nodes ^= bit
+      cells |= self.node_cell_masks[self.bit_nodes[bit]]
+
+    hexagon_edges = self.hexagon_edges & ~path_edges
+    while hexagon_edges:
+      bit = hexagon_edges & -hexagon_edges
+      hexagon_edges ^= bit
+      cells |= self.edge_cell_masks[bit]
+
+    for cell_bit, mask, number in self.triangle_checks:
+      if bin(path_edges & mask).count("1") != number:
+        cells |= cell_bit
+
+    return cells
+
+
+  def invalid_areas(self, path, symmetry_path, path_bits=None):
+    """
+    Generate the invalid areas, as bitmasks of cells, of a path which ends at
+    an end node.  If none are generated, the path is a solution.  'path_bits'
+    are the bitmasks of path_bits(), if they are already known.
+
+    Areas are validated as they are needed, cheapest first, so that anything
+    which only needs one invalid area can stop without validating the rest:
+    areas which have been validated before, then areas without tetris pieces.
+    """
+
+    # Make this path available for observers to pick up, as a copy because the
+    # search extends and shortens the path in place
+    self.path = path[:]
+
+    if path_bits is None:
+      path_bits = self.path_bits(path, symmetry_path)
+
+    # Without elimination marks, triangles and hexagons can be checked over
+    # the whole board at once.  Any area around a broken one is invalid and
+    # is the only area which needs to be filled to find it.
+    broken_area = 0
+    if not self.y:
+      broken_cells = self.broken_cells(*path_bits)
+      if broken_cells:
+        broken_area = self.fill_cells(broken_cells & -broken_cells,
+                                      self.cell_moves(path_bits[1]))
+        yield broken_area
+
+    # Step 2 - work out which areas the path defines to help solve many of the
+    # other cell types
+    # Note, with elimination marks we cannot solve triangles or hexagons yet as
+    # they may depend on them
+    areas = self.define_areas(path_bits[1])
+
+    self.clear_removed()
+
+    cached_areas = []
+    uncached_areas = []
+    for area in areas:
+      key = self.area_signature(area, *path_bits)
+      if key in self.area_cache:
+        cached_areas.append((area, key))
+      else:
+        uncached_areas.append((self.area_cost(area), area, key))
+    uncached_areas.sort()
+
+    valid = not broken_area
+    for area, key in cached_areas + \
+                     [uncached[1:] for uncached in uncached_areas]:
+      # Already known to be invalid
+      if area == broken_area:
+        continue
+
+      if not self.cached_validate_area(area, key, *path_bits):
+        valid = False
+        yield area
+
+    if valid:
+      # A solution has been found
+      self.areas = [self.area_cells(area) for area in areas]
+
+
+  def sealed_areas_valid(self, path, symmetry_path, nodes, edges):
+    """
+    Check any areas sealed off by the last move of a partial path.
+
+    An area is sealed once the path (and its symmetry path) has closed it off
+    and moved on, so that the end of the path no longer touches any of its
+    cells.  The path can never enter it again, so the area will be exactly the
+    same for every longer path and, if it is invalid, so is every longer path.
+    'nodes' and 'edges' are bitmasks of the nodes and edges of the path and
+    symmetry path.
+    """
+
+    if len(path) < 2:
+      return True
+
+    # Only areas around the nodes just left can have become sealed
+    left_nodes = [path[-2]]
+    head_cells = self.node_cell_masks[path[-1]]
+    if symmetry_path:
+      left_nodes.append(symmetry_path[-2])
+      head_cells |= self.node_cell_masks[symmetry_path[-1]]
+
+    moves = None
+    seen = head_cells
+    for node in left_nodes:
+      for cell in self.node_cells[node]:
+        cell_bit = self.cell_bits[cell]
+        if cell_bit & seen:
+          continue
+
+        # Flood fill the area, which isn't sealed if it reaches the end of the
+        # path
+        if moves is None:
+          moves = self.cell_moves(edges)
+        area = self.fill_cells(cell_bit, moves)
+        seen |= area
+        if area & head_cells:
+          continue
+
+        self.clear_removed()
+        if not self.cached_validate_area(
+                 area, self.area_signature(area, nodes, edges), nodes, edges):
+          return False
+
+    return True
+
+
+  def reachable_nodes(self, head, blocked):
+    """
+    Flood fill from the head of a path over every node which is not blocked
+    and return a bitmask of the nodes which can be reached.  Each step of the
+    fill moves every reached node at once by shifting the bitmask.
+    """
+
+    left, up, right, down = self.fill_masks
+    row = self.width + 1
+    free = self.fill_nodes & ~blocked
+
+    reached = self.node_bits[head] | (free & self.fill_steps[head])
+    while True:
+      grown = reached | (free & (((reached & left) >> 1) |
+                                 ((reached & up) >> row) |
+                                 ((reached & right) << 1) |
+                                 ((reached & down) << row)))
+      if grown == reached:
+        return reached
+      reached = grown
+
+
+  def can_complete(self, head, blocked, edges):
+    """
+    See if a path could still be extended from its head to an end node,
+    passing over every hexagon not yet covered if they are all required.
+    'blocked' and 'edges' are bitmasks of the nodes and edges of the path and
+    its symmetry path.
+    """
+
+    reached = self.reachable_nodes(head, blocked)
+
+    if not reached & self.end_node_mask & ~self.node_bits[head]:
+      return False
+
+    # Without elimination marks, every hexagon must be covered by the path or
+    # its symmetry path
+    if not self.y:
+      for bit, bits in self.hexagon_node_bits:
+        if not bit & blocked and not reached & bits:
+          return False
+      # Both nodes of a hexagon edge, or of its mirror image, must be reached
+      for bit, bits, symmetry_bits in self.hexagon_edge_bits:
+        if not bit & edges and reached & bits != bits \
+           and reached & symmetry_bits != symmetry_bits:
+          return False
+
+    return True
+
+
+  def triangles_possible(self, counts, node, edge_bit, symmetry_edge_bit,
+                         edges, blocked, heads):
+    """
+    See if every triangle affected by a move can still have the right number
+    of edges, when there are no elimination marks to remove it.
+
+    'counts' holds the number of path edges around each triangle before the
+    move.  The triangles along the new edges ('edge_bit' and, with symmetry,
+    'symmetry_edge_bit') must not get too many, and the triangles around the
+    node being left, whose other edges can no longer be taken, must still be
+    able to get enough.  'edges', 'blocked' and 'heads' are bitmasks of the
+    path edges, path nodes and ends of the path after the move.
+    """
+
+    def count_after_move(triangle):
+      count = counts[triangle]
+      if self.triangle_edge_masks[triangle] & edge_bit:
+        count += 1
+      if self.triangle_edge_masks[triangle] & symmetry_edge_bit:
+        count += 1
+      return count
+
+    for bit in (edge_bit, symmetry_edge_bit):
+      for triangle in self.edge_triangles.get(bit, ()):
+        if count_after_move(triangle) > self.triangle_numbers[triangle]:
+          return False
+
+    # An edge can still be taken if it is not on the path and neither of its
+    # nodes is on the path, other than at its ends
+    for triangle in self.node_triangles[node]:
+      count = count_after_move(triangle)
+      for bit, nodes in self.triangle_edges[triangle]:
+        if not bit & edges and not nodes & blocked & ~heads:
+          count += 1
+      if count < self.triangle_numbers[triangle]:
+        return False
+
+    return True
+
+
+  def stop(self):
+    """
+    Stop solving, telling any worker processes to stop straight away rather
+    than waiting for the solve to next check whether it has been stopped.
+    """
+
+    self.keep_solving = False
+    if self.cancel is not None:
+      self.cancel.set()
+
+
+  def stopped(self):
+    """
+    Yield to observers if it's time to, and return True if solving has been
+    stopped.
+    """
+
+    self.yield_check()
+    return not self.keep_solving
+
+
+  def stop_check(self, interval=256):
+    """
+    Return a function for a long search to call at every step, which returns
+    True if solving has been stopped.  Only every 'interval' calls go as far
+    as stopped(), as even seeing if it's time to yield takes a while.
+    """
+
+    # A count down to the next check, in a list so that check() can update it
+    countdown = [interval]
+
+    def check():
+      countdown[0] -= 1
+      if countdown[0]:
+        return False
+      countdown[0] = interval
+      return self.stopped()
+
+    return check
+
+
   def yield_check(self):
     """See if it's time to yield to observers."""
 
     if time.time() > self.yield_time:
-      # Allow observers to do some processing
+      # Store any new blue tetris results, then allow observers to do some
+      # processing
+      if self.tetris_cache is not None:
+        self.tetris_cache.commit()
       self.notify_observers()
       self.yield_time = time.time() + self.yield_interval
 
 
-  def check_all_paths(self, start_node):
-    """Look at every possible path from the given start node."""
+  def remove_pending(self, pending, pending_depths, bit, depth):
+    """Remove the next node with the given bit from pending from depth on."""
+
+    depths = pending_depths[bit]
+    while depths and depths[-1] >= depth:
+      n = depths.pop()
+      pending[n] = [next_move for next_move in pending[n]
+                    if next_move[1] != bit]
+
+
+  def share_work(self, path, pending, pending_depths):
+    """
+    Give the next nodes still to be tried nearest the start of the path to
+    idle workers, as they have the most paths beyond them.
+    """
+
+    # Another worker has already shared some paths which are still waiting
+    if not self.tasks.empty():
+      return
+
+    for n, next_moves in enumerate(pending):
+      if not next_moves:
+        continue
+
+      with self.outstanding.get_lock():
+        self.outstanding.value += len(next_moves)
+      for next_move in next_moves:
+        pending_depths[next_move[1]].remove(n)
+        self.tasks.put(path[:n + 1] + [next_move[0]])
+      pending[n] = []
+      return
 
-    # A queue of paths to search
-    queue = [[start_node]]
 
-    while queue:
-      # Fetch the next path on the queue
-      path = queue.pop()
+  def check_all_paths(self, start_path):
+    """
+    Look at every possible path which begins with the given path, a list of
+    nodes from a start node.  Only the last node of the given path is checked,
+    as the paths up to it are assumed to have been checked already.
+
+    This is a backtracking depth first search.  A single path is extended and
+    shortened in place and, for each node on the path, 'pending' holds the
+    next nodes still to be tried from it, so memory is bounded by the size of
+    the board rather than the number of paths waiting to be searched.
+    """
 
+    start_node = start_path[0]
+    path = [start_node]
+    # With symmetry, the symmetry path, extended and shortened alongside the
+    # path
+    symmetry_path = []
+    if self.symmetry != SymmetryType.NONE:
+      symmetry_path.append(self.symmetry_xy(*start_node))
+    # Bitmasks of the nodes visited by the path and by its symmetry path, one
+    # entry for each node on the path
+    visited = [self.node_bits[start_node]]
+    symmetry_visited = [self.node_bits[symmetry_path[0]] if symmetry_path
+                        else 0]
+    # Bitmasks of the edges of the path and symmetry path, alongside the bits
+    # of the edge each node added to the path and symmetry path
+    edges = [0]
+    new_edges = [(0, 0)]
+    # For each node on the path (except the last), a list of (next node, next
+    # node bit, next symmetry node, next symmetry node bit, next edge bit, next
+    # symmetry edge bit) still to be tried
+    pending = []
+    # For each next node bit, the depths at which it is waiting in 'pending',
+    # deepest last.  Apart from sharing work with other workers, which takes
+    # from the shallow end, entries are only ever removed from the deep end,
+    # as anything deeper has always been removed first
+    pending_depths = defaultdict(list)
+
+    # The next nodes to try from the start node, if the board's reflections
+    # and rotations mean only some of them need trying
+    first_moves = None
+    if len(start_path) == 1:
+      first_moves = self.first_moves.get(start_node)
+
+    # Without elimination marks, triangles can be checked as the path grows,
+    # keeping a count of the path edges around each triangle
+    check_triangles = self.triangles and not self.y
+    triangle_counts = [0] * len(self.triangles)
+
+    def extend(next_node, next_bit, next_symmetry_node, next_symmetry_bit,
+               edge_bit, symmetry_edge_bit):
+      """Extend the path (and symmetry path) in place with the next node."""
+
+      path.append(next_node)
+      if symmetry_path:
+        symmetry_path.append(next_symmetry_node)
+      visited.append(visited[-1] | next_bit)
+      symmetry_visited.append(symmetry_visited[-1] | next_symmetry_bit)
+      edges.append(edges[-1] | edge_bit | symmetry_edge_bit)
+      new_edges.append((edge_bit, symmetry_edge_bit))
+      if check_triangles:
+        for bit in new_edges[-1]:
+          for triangle in self.edge_triangles.get(bit, ()):
+            triangle_counts[triangle] += 1
+
+    # Follow the given path, with nothing else to try from any of its nodes
+    for next_node in start_path[1:]:
+      moves = self.node_moves[path[-1]]
+      direction = [move and move[0] for move in moves].index(next_node)
+      next_node, next_bit, edge_bit = moves[direction]
+      next_symmetry_node, next_symmetry_bit, symmetry_edge_bit = None, 0, 0
+      if symmetry_path:
+        next_symmetry_node, next_symmetry_bit, symmetry_edge_bit = \
+          self.symmetry_moves[path[-1]][direction]
+      pending.append([])
+      extend(next_node, next_bit, next_symmetry_node, next_symmetry_bit,
+             edge_bit, symmetry_edge_bit)
+
+    while True:
       self.path_attempts += 1
 
       self.yield_check()
 
+      # Give some of the paths still to be tried to idle workers
+      if self.tasks is not None and not self.path_attempts % 1000 and \
+         self.idle.value:
+        self.share_work(path, pending, pending_depths)
+
       # Solving has been cancelled
       if not self.keep_solving:
         return
 
-      symmetry_path = self.symmetry_path(path)
+      # Whether an invalid area has been found which means that this path
+      # and every path containing it can be abandoned
+      abandon_path = False
 
       # Check this path for a solution
-      # If this path is not valid, return which areas caused the problem
-      valid, invalid_areas = self.validate_path(path, symmetry_path)
-
-      if valid:
-        self.solution_found = True
-        return
-
-      # Consider each invalid area
-      for invalid_area in invalid_areas:
-
+      if path[-1] in self.end_nodes:
         # If there are multiple end nodes on the board, an area containing an
         # end node which is not part of that path can be incorrectly marked as
-        # invalid, so these are identified and ignored
-        ignore_end_node = False
-
-        # Check that this area doesn't contain an end node not on the path
+        # invalid, so the cells around these end nodes are identified and
+        # invalid areas containing them are ignored (with symmetry, the path
+        # and symmetry path can't both end at any one end node)
+        end_cells = 0
         if len(self.end_nodes) > 1:
-          for x, y in invalid_area:
-            for node in [(x, y), (x + 1, y), (x, y + 1), (x + 1, y + 1)]:
-              if node in self.end_nodes \
-                and (node != path[-1] \
-                or (symmetry_path and node != symmetry_path[-1])):
-                ignore_end_node = True
-                # Drop out of inner loop
-                break
-            # Drop out of outer loop
-            if ignore_end_node:
-              break
-
-        # Skip to the next invalid area
-        if ignore_end_node:
-          continue
-
-        # Work out which portion of the path/symmetry path defines the invalid
-        # area and remove matching entries from the queue
-        invalid_path = set()
-        for current_path in (path, symmetry_path):
-          for x, y in current_path:
-            for node in [(x, y), (x - 1, y), (x, y - 1), (x - 1, y - 1)]:
-              if node in invalid_area:
-                invalid_path.add((x, y))
-
-        # Remove invalid paths from the queue
-        for n in range(len(queue) - 1, -1, -1):
-          if invalid_path.issubset(set(queue[n])):
-            del queue[n]
-
-      if invalid_areas and not ignore_end_node:
-        continue
-
-      # Check each direction from the end of this path
-      x, y = path[-1]
+          for node in self.end_nodes:
+            if symmetry_path or node != path[-1]:
+              end_cells |= self.node_cell_masks[node]
 
-      directions = [0, 1, 2, 3]
-      if self.randomise:
-        random.shuffle(directions)
-
-      for direction in directions:
-        if direction == 0 and x > 0:
-          # Try left if we're not at the left wall
-          next_node = (x - 1, y)
-
-        elif direction == 1 and y > 0:
-          # Try up if we're not at the top wall
-          next_node = (x, y - 1)
-
-        elif direction == 2 and x < self.width:
-          # Try right if we're not at the right wall
-          next_node = (x + 1, y)
+        # Areas are only validated until one is found which can be used to
+        # abandon paths
+        valid = True
+        for invalid_area in self.invalid_areas(
+            path, symmetry_path,
+            (visited[-1] | symmetry_visited[-1], edges[-1])):
+          valid = False
+          if not invalid_area & end_cells:
+            abandon_path = True
+            break
 
-        elif direction == 3 and y < self.height:
-          # Try down if we're not at the bottom wall
-          next_node = (x, y + 1)
+        if valid:
+          self.solution_found = True
+          return
 
-        else:
-          continue
+      if abandon_path:
+        # Work out which portion of the path/symmetry path defines the invalid
+        # area and remove any pending path containing it.  Only the two
+        # deepest nodes of the invalid path on the path matter, along with the
+        # nodes of the invalid path which are only on the symmetry path
+        last_depth = 0
+        second_last_depth = 0
+        symmetry_invalid_path = 0
+        for depth, node in enumerate(path):
+          if invalid_area & self.node_cell_masks[node]:
+            last_depth, second_last_depth = depth, last_depth
+        for node in symmetry_path:
+          if invalid_area & self.node_cell_masks[node]:
+            symmetry_invalid_path |= self.node_bits[node]
+
+        # A pending path is the path up to depth n followed by one next node,
+        # so it contains the invalid path if the only nodes of the invalid path
+        # missing up to depth n are that next node
+        if not symmetry_invalid_path:
+          # Nothing is missing from the path beyond the last depth, and only
+          # the node at the last depth is missing from the second last depth
+          for n in range(last_depth, len(pending)):
+            for next_move in pending[n]:
+              pending_depths[next_move[1]].pop()
+            pending[n] = []
+          self.remove_pending(pending, pending_depths,
+                              self.node_bits[path[last_depth]],
+                              second_last_depth)
+        elif not symmetry_invalid_path & (symmetry_invalid_path - 1):
+          # Only the single node of the symmetry path is missing from the path
+          # beyond the last depth
+          self.remove_pending(pending, pending_depths, symmetry_invalid_path,
+                              last_depth)
+
+      # Without elimination marks every hexagon edge must be covered, so the
+      # path cannot leave this node without taking the hexagon edges around it
+      hexagon_edges = 0
+      if not self.y:
+        hexagon_edges = self.node_hexagon_edges[path[-1]] & ~edges[-1]
+
+      next_moves = []
+      if not abandon_path and \
+         self.can_complete(path[-1], visited[-1] | symmetry_visited[-1],
+                           edges[-1]) and \
+         self.sealed_areas_valid(path, symmetry_path,
+                                 visited[-1] | symmetry_visited[-1],
+                                 edges[-1]):
+        # Check each direction from the end of this path
+        moves = self.node_moves[path[-1]]
+        symmetry_moves = self.symmetry_moves.get(path[-1])
+
+        directions = [0, 1, 2, 3]
+        if self.randomise:
+          random.shuffle(directions)
+
+        for direction in directions:
+          # Skip walls and missing edges
+          if moves[direction] is None:
+            continue
+          next_node, next_bit, edge_bit = moves[direction]
 
-        # See if the next node is already part of the path
-        if next_node in path:
-          continue
+          # See if the next node is already part of the path
+          if visited[-1] & next_bit:
+            continue
 
-        # See if the next edge is a missing edge
-        next_x, next_y = next_node
-        if (x == next_x and                                              \
-            self.h_edges[min(y, next_y)][x].type == EdgeType.MISSING) or \
-           (y == next_y and                                              \
-            self.v_edges[y][min(x, next_x)].type == EdgeType.MISSING):
-          continue
+          # See if the next node is a reflection or rotation of another next
+          # node from the start node
+          if first_moves is not None and len(path) == 1 and \
+             next_node not in first_moves:
+            continue
 
-        if self.symmetry != SymmetryType.NONE:
-          # See if the next node is already part of the symmetry path or the
-          # next node on the symmetry path
-          next_symmetry_node = self.symmetry_xy(next_x, next_y)
-          if next_node in symmetry_path + [next_symmetry_node]:
+          next_symmetry_node = None
+          next_symmetry_bit = 0
+          symmetry_edge_bit = 0
+          if symmetry_moves is not None:
+            # See if the next edge on the symmetry path is a missing edge or
+            # the next node is its own mirror image
+            if symmetry_moves[direction] is None:
+              continue
+
+            # See if the next node is already part of the symmetry path
+            if symmetry_visited[-1] & next_bit:
+              continue
+
+            next_symmetry_node, next_symmetry_bit, symmetry_edge_bit = \
+              symmetry_moves[direction]
+
+          # See if a hexagon edge would be passed by
+          next_edges = edges[-1] | edge_bit | symmetry_edge_bit
+          if hexagon_edges & ~next_edges:
             continue
 
-          # See if the next edge on the symmetry path is a missing edge
-          sx, sy = symmetry_path[-1]
-          next_x, next_y = next_symmetry_node
-          if (sx == next_x and                                               \
-              self.h_edges[min(sy, next_y)][sx].type == EdgeType.MISSING) or \
-             (sy == next_y and                                               \
-             self.v_edges[sy][min(sx, next_x)].type == EdgeType.MISSING):
+          # See if a triangle would get too many edges, or could no longer get
+          # enough
+          next_heads = next_bit | next_symmetry_bit
+          if check_triangles and not self.triangles_possible(
+               triangle_counts, path[-1], edge_bit, symmetry_edge_bit,
+               next_edges, visited[-1] | symmetry_visited[-1] | next_heads,
+               next_heads):
             continue
 
-        # Path is clear to analyse
-        queue.append(path + [next_node])
+          # Path is clear to analyse
+          next_moves.append((next_node, next_bit, next_symmetry_node,
+                             next_symmetry_bit, edge_bit, symmetry_edge_bit))
+          pending_depths[next_bit].append(len(pending))
+
+      pending.append(next_moves)
+
+      # Backtrack to the last node on the path which has a next node to try
+      while pending and not pending[-1]:
+        pending.pop()
+        path.pop()
+        if symmetry_path:
+          symmetry_path.pop()
+        visited.pop()
+        symmetry_visited.pop()
+        edges.pop()
+        if check_triangles:
+          for bit in new_edges[-1]:
+            for triangle in self.edge_triangles.get(bit, ()):
+              triangle_counts[triangle] -= 1
+        new_edges.pop()
+
+      if not pending:
+        # All paths from this node have been tried and no solution was found
+        return
 
-    # All paths from this node have been tried and no solution was found
-    return
+      next_move = pending[-1].pop()
+      pending_depths[next_move[1]].pop()
+      extend(*next_move)
 
 
   def populate_positions(self):
@@ -964,6 +1843,632 @@ class Puzzle(object):
           elif self.cells[y][x].is_y():
             self.y.append((x, y))
 
+    self.compile_bitboard()
+    self.compile_automorphisms()
+
+
+  def compile_bitboard(self):
+    """
+    Build a bitboard form of the puzzle for the path search.
+
+    Every node and edge is given an index so that sets of them can be held as
+    integer bitmasks and membership tests become single bit operations:
+
+    Nodes            V Edges          H Edges
+    0---1---2---3    +-0-+-1-+-2-+    +---+---+---+
+    |   |   |   |    |   |   |   |    9  10  11  12
+    4---5---6---7    +-3-+-4-+-5-+    +---+---+---+
+    |   |   |   |    |   |   |   |   13  14  15  16
+    8---9--10--11    +-6-+-7-+-8-+    +---+---+---+
+    """
+
+    v_edge_count = self.width * (self.height + 1)
+
+    # Bit for each (x, y) node, and the (x, y) node for each bit
+    self.node_bits = {}
+    self.bit_nodes = {}
+    for y in range(self.height + 1):
+      for x in range(self.width + 1):
+        self.node_bits[(x, y)] = 1 << (y * (self.width + 1) + x)
+        self.bit_nodes[self.node_bits[(x, y)]] = (x, y)
+
+    # Bit for the edge between two (x, y) nodes, looked up in either order, and
+    # the (x, y) V or H edge for each bit
+    self.edge_bits = {}
+    self.bit_v_edges = {}
+    self.bit_h_edges = {}
+    self.missing_edges = 0
+    self.hexagon_edges = 0
+    for y in range(self.height + 1):
+      for x in range(self.width):
+        bit = 1 << (y * self.width + x)
+        self.edge_bits[((x, y), (x + 1, y))] = bit
+        self.edge_bits[((x + 1, y), (x, y))] = bit
+        self.bit_v_edges[bit] = (x, y)
+        if self.v_edges[y][x].is_missing():
+          self.missing_edges |= bit
+        elif self.v_edges[y][x].is_hexagon():
+          self.hexagon_edges |= bit
+    for y in range(self.height):
+      for x in range(self.width + 1):
+        bit = 1 << (v_edge_count + y * (self.width + 1) + x)
+        self.edge_bits[((x, y), (x, y + 1))] = bit
+        self.edge_bits[((x, y + 1), (x, y))] = bit
+        self.bit_h_edges[bit] = (x, y)
+        if self.h_edges[y][x].is_missing():
+          self.missing_edges |= bit
+        elif self.h_edges[y][x].is_hexagon():
+          self.hexagon_edges |= bit
+
+    self.hexagon_node_mask = 0
+    for node in self.hexagon_nodes:
+      self.hexagon_node_mask |= self.node_bits[node]
+
+    # For every node, the moves which can be made in each direction (left, up,
+    # right, down) as (next node, next node bit, edge bit), or None if there
+    # is a wall or a missing edge in that direction
+    self.node_moves = {}
+    for (x, y), bit in self.node_bits.iteritems():
+      moves = []
+      for next_node in [(x - 1, y), (x, y - 1), (x + 1, y), (x, y + 1)]:
+        edge_bit = self.edge_bits.get(((x, y), next_node))
+        if edge_bit is None or edge_bit & self.missing_edges:
+          moves.append(None)
+        else:
+          moves.append((next_node, self.node_bits[next_node], edge_bit))
+      self.node_moves[(x, y)] = moves
+
+    # With symmetry, for every node, the mirror image of each of its moves as
+    # (mirrored next node, its bit, mirrored edge bit), or None if the move or
+    # its mirror image can't be made, or the move is onto a node which is its
+    # own mirror image
+    self.symmetry_moves = {}
+    if self.symmetry != SymmetryType.NONE:
+      for node, moves in self.node_moves.iteritems():
+        symmetry_node = self.symmetry_xy(*node)
+        symmetry_moves = []
+        for move in moves:
+          symmetry_move = None
+          if move is not None:
+            next_symmetry_node = self.symmetry_xy(*move[0])
+            edge_bit = self.edge_bits[(symmetry_node, next_symmetry_node)]
+            if next_symmetry_node != move[0] and \
+               not edge_bit & self.missing_edges:
+              symmetry_move = (next_symmetry_node,
+                               self.node_bits[next_symmetry_node], edge_bit)
+          symmetry_moves.append(symmetry_move)
+        self.symmetry_moves[node] = symmetry_moves
+
+    # Bit for each (x, y) cell, numbered in the same way as V edges, and the
+    # (x, y) cell for each bit
+    self.cell_bits = {}
+    self.bit_cells = {}
+    self.cell_mask = 0
+    # For each cell bit, its type and colour (of a square or star) or number
+    # (of triangles) and bitmasks of the edges and nodes around it
+    self.cell_types = {}
+    self.cell_colours = {}
+    self.cell_numbers = {}
+    self.cell_edge_masks = {}
+    self.cell_node_masks = {}
+    # For each edge bit, a bitmask of the cells either side of it
+    self.edge_cell_masks = {}
+    # Bitmasks of the cells which can step left, up, right and down into a
+    # neighbouring cell, if there is no path in the way
+    self.cell_move_masks = [0, 0, 0, 0]
+    for y in range(self.height):
+      for x in range(self.width):
+        bit = 1 << (y * self.width + x)
+        self.cell_bits[(x, y)] = bit
+        self.bit_cells[bit] = (x, y)
+        self.cell_mask |= bit
+
+        cell = self.cells[y][x]
+        self.cell_types[bit] = cell.type
+        if cell.is_square():
+          self.cell_colours[bit] = cell.square.colour
+        elif cell.is_star():
+          self.cell_colours[bit] = cell.star.colour
+        elif cell.is_triangle():
+          self.cell_numbers[bit] = cell.triangle.number
+
+        corners = [(x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)]
+        self.cell_edge_masks[bit] = 0
+        self.cell_node_masks[bit] = 0
+        for n in range(4):
+          edge_bit = self.edge_bits[(corners[n], corners[(n + 1) % 4])]
+          self.cell_edge_masks[bit] |= edge_bit
+          self.edge_cell_masks[edge_bit] = \
+            self.edge_cell_masks.get(edge_bit, 0) | bit
+          self.cell_node_masks[bit] |= self.node_bits[corners[n]]
+
+        for direction, can_move in enumerate([x > 0, y > 0,
+                                              x < self.width - 1,
+                                              y < self.height - 1]):
+          if can_move:
+            self.cell_move_masks[direction] |= bit
+
+    # Bitmasks of the cells containing tetris pieces, blue tetris pieces and
+    # elimination marks
+    self.tetris_mask = 0
+    self.blue_tetris_mask = 0
+    for x, y in self.tetris:
+      self.tetris_mask |= self.cell_bits[(x, y)]
+      if self.cells[y][x].tetris.negative:
+        self.blue_tetris_mask |= self.cell_bits[(x, y)]
+    self.y_mask = 0
+    for cell in self.y:
+      self.y_mask |= self.cell_bits[cell]
+
+    # For every node, the cells it is a corner of, as a list and a bitmask
+    self.node_cells = {}
+    self.node_cell_masks = {}
+    for x, y in self.node_bits:
+      self.node_cells[(x, y)] = [(cx, cy)
+        for cx, cy in [(x - 1, y - 1), (x, y - 1), (x - 1, y), (x, y)]
+        if 0 <= cx < self.width and 0 <= cy < self.height]
+      self.node_cell_masks[(x, y)] = 0
+      for cell in self.node_cells[(x, y)]:
+        self.node_cell_masks[(x, y)] |= self.cell_bits[cell]
+
+    # Masks for flood filling over nodes: the nodes which can be used at all
+    # and, for each direction (left, up, right, down), the nodes which can step
+    # that way.  With symmetry, the mirrored step must also be possible and a
+    # node which is its own mirror image can never be stepped onto.  That node
+    # can still be the head of a path (as a start node), so for every node
+    # there is also a bitmask of the nodes it can step to, to begin the fill.
+    self.fill_nodes = 0
+    self.fill_masks = [0, 0, 0, 0]
+    self.fill_steps = {}
+    for node, bit in self.node_bits.iteritems():
+      symmetry_node = self.symmetry_xy(*node)
+      self.fill_steps[node] = 0
+      for direction, move in enumerate(self.node_moves[node]):
+        if move is None:
+          continue
+        if symmetry_node is not None and \
+           self.edge_bits[(symmetry_node, self.symmetry_xy(*move[0]))] \
+           & self.missing_edges:
+          continue
+        self.fill_steps[node] |= move[1]
+        if symmetry_node != node:
+          self.fill_masks[direction] |= bit
+      if symmetry_node != node:
+        self.fill_nodes |= bit
+
+    self.end_node_mask = 0
+    for node in self.end_nodes:
+      self.end_node_mask |= self.node_bits[node]
+
+    # For every hexagon node, its bit alongside the bits of it and its mirror
+    # image, either of which the path can visit to cover it
+    self.hexagon_node_bits = []
+    for node in self.hexagon_nodes:
+      bit = self.node_bits[node]
+      self.hexagon_node_bits.append(
+        (bit, bit | self.node_bits.get(self.symmetry_xy(*node), 0)))
+
+    # For every hexagon edge, its bit alongside the bits of its two nodes and
+    # of the two nodes of its mirror image, either pair of which the path must
+    # be able to reach to cover it
+    self.hexagon_edge_bits = []
+    # For every node, a bitmask of the hexagon edges which can never be covered
+    # once the path has passed through that node without taking them, i.e.
+    # the hexagon edges touching it or, with symmetry, its mirror image
+    self.node_hexagon_edges = dict.fromkeys(self.node_bits, 0)
+    for (node, next_node), bit in self.edge_bits.iteritems():
+      if not bit & self.hexagon_edges or node > next_node:
+        continue
+      bits = self.node_bits[node] | self.node_bits[next_node]
+      symmetry_bits = bits
+      if self.symmetry != SymmetryType.NONE:
+        symmetry_bits = self.node_bits[self.symmetry_xy(*node)] | \
+                        self.node_bits[self.symmetry_xy(*next_node)]
+      self.hexagon_edge_bits.append((bit, bits, symmetry_bits))
+
+      for edge_node in (node, next_node):
+        self.node_hexagon_edges[edge_node] |= bit
+        if self.symmetry != SymmetryType.NONE:
+          self.node_hexagon_edges[self.symmetry_xy(*edge_node)] |= bit
+
+    # For every triangle, its number, a bitmask of the edges around its cell
+    # and a list of those edges' bits alongside the bits of their nodes
+    self.triangle_numbers = []
+    self.triangle_edge_masks = []
+    # For every triangle, its cell bit, edge mask and number together, to check
+    # them all at once
+    self.triangle_checks = []
+    # The path edges which can make a difference to whether an area is valid
+    self.signature_edges = self.hexagon_edges
+    self.triangle_edges = []
+    # For every edge, the triangles it touches and, for every node, the
+    # triangles in the cells around it or, with symmetry, its mirror image
+    self.edge_triangles = {}
+    self.node_triangles = dict((node, []) for node in self.node_bits)
+    for triangle, (x, y) in enumerate(self.triangles):
+      self.triangle_numbers.append(self.cells[y][x].triangle.number)
+      corners = [(x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)]
+      mask = 0
+      edges = []
+      for n in range(4):
+        node, next_node = corners[n], corners[(n + 1) % 4]
+        bit = self.edge_bits[(node, next_node)]
+        mask |= bit
+        edges.append((bit, self.node_bits[node] | self.node_bits[next_node]))
+        self.edge_triangles.setdefault(bit, []).append(triangle)
+      self.triangle_edge_masks.append(mask)
+      self.triangle_edges.append(edges)
+      self.signature_edges |= mask
+      self.triangle_checks.append((self.cell_bits[(x, y)], mask,
+                                   self.triangle_numbers[-1]))
+
+      for node in corners:
+        self.node_triangles[node].append(triangle)
+        if self.symmetry != SymmetryType.NONE:
+          self.node_triangles[self.symmetry_xy(*node)].append(triangle)
+
+
+  def compile_automorphisms(self):
+    """
+    Find the reflections and rotations of the board which leave it exactly the
+    same, so that paths which are reflections or rotations of each other are
+    only searched once.  Every node, edge and cell must be moved onto one of
+    the same type, with tetris shapes reflected or rotated along with the
+    board.  This is only done without symmetry, as a symmetry path already
+    halves the start nodes.
+
+    'automorphisms' is a list of these, other than leaving the board as it is,
+    as dicts mapping each node to the node it is moved to.
+    'search_start_nodes' are the start nodes to search from, one from each set
+    of start nodes which the automorphisms move onto each other.
+    'first_moves' maps a start node which some automorphisms leave in place to
+    the set of next nodes to try from it, one from each set of its next nodes
+    which those automorphisms move onto each other.  Any solution found is a
+    solution of the board as it is, so nothing needs to be moved back.
+    """
+
+    self.automorphisms = []
+    self.search_start_nodes = list(self.start_nodes)
+    self.first_moves = {}
+    if self.symmetry != SymmetryType.NONE:
+      return
+
+    # Positions are in half cells, so nodes are at even (x, y), cells at odd
+    # (x, y) and edges in between
+    width = 2 * self.width
+    height = 2 * self.height
+
+    def features(a, b, c, d):
+      """
+      Return a description of every node, edge and cell which isn't empty,
+      keyed by position, with tetris shapes transformed by the given matrix.
+      """
+
+      def tetris_shapes(piece):
+        shapes = set()
+        for shape in piece.shapes:
+          shape = [(a * x + b * y, c * x + d * y) for x, y in shape]
+          min_x, min_y = min(shape)
+          shapes.add(frozenset((x - min_x, y - min_y) for x, y in shape))
+        return frozenset(shapes), piece.negative
+
+      board = {}
+      for y in range(self.height + 1):
+        for x in range(self.width + 1):
+          node = self.nodes[y][x]
+          if node.type:
+            board[(2 * x, 2 * y)] = (node.type, node.is_hexagon() and
+                                     node.hexagon.colour)
+          if x < self.width and self.v_edges[y][x].type:
+            edge = self.v_edges[y][x]
+            board[(2 * x + 1, 2 * y)] = (edge.type, edge.is_hexagon() and
+                                         edge.hexagon.colour)
+          if y < self.height and self.h_edges[y][x].type:
+            edge = self.h_edges[y][x]
+            board[(2 * x, 2 * y + 1)] = (edge.type, edge.is_hexagon() and
+                                         edge.hexagon.colour)
+          if x < self.width and y < self.height and self.cells[y][x].type:
+            cell = self.cells[y][x]
+            detail = None
+            if cell.is_square():
+              detail = cell.square.colour
+            elif cell.is_star():
+              detail = cell.star.colour
+            elif cell.is_triangle():
+              detail = cell.triangle.number
+            elif cell.is_tetris():
+              detail = tetris_shapes(cell.tetris)
+            board[(2 * x + 1, 2 * y + 1)] = (cell.type, detail)
+      return board
+
+    # Reflections and rotations as matrices, which only include turning
+    # through 90 degrees on a square board
+    matrices = [(-1, 0, 0, 1), (1, 0, 0, -1), (-1, 0, 0, -1)]
+    if self.width == self.height:
+      matrices += [(0, 1, 1, 0), (0, -1, 1, 0), (0, 1, -1, 0), (0, -1, -1, 0)]
+
+    board = features(1, 0, 0, 1)
+    for a, b, c, d in matrices:
+      # Move the board back over itself after transforming it
+      offset_x = -min(a * x + b * y for x in (0, width) for y in (0, height))
+      offset_y = -min(c * x + d * y for x in (0, width) for y in (0, height))
+      transform = lambda x, y: (a * x + b * y + offset_x,
+                                c * x + d * y + offset_y)
+
+      if all(board.get(transform(x, y)) == feature for (x, y), feature
+             in features(a, b, c, d).iteritems()):
+        automorphism = {}
+        for x, y in self.node_bits:
+          next_x, next_y = transform(2 * x, 2 * y)
+          automorphism[(x, y)] = (next_x / 2, next_y / 2)
+        self.automorphisms.append(automorphism)
+
+    if not self.automorphisms:
+      return
+
+    self.search_start_nodes = []
+    seen = set()
+    for node in self.start_nodes:
+      if node in seen:
+        continue
+      self.search_start_nodes.append(node)
+      seen.add(node)
+      seen.update(automorphism[node] for automorphism in self.automorphisms)
+
+      fixed = [mapping for mapping in self.automorphisms
+               if mapping[node] == node]
+      if not fixed:
+        continue
+      # The search tries the last direction first, so the next node kept from
+      # each set is the one it would have tried first
+      self.first_moves[node] = set()
+      seen_moves = set()
+      for move in reversed(self.node_moves[node]):
+        if move is None or move[0] in seen_moves:
+          continue
+        self.first_moves[node].add(move[0])
+        seen_moves.add(move[0])
+        seen_moves.update(automorphism[move[0]] for automorphism in fixed)
+
+
+  def compile_placements(self):
+    """
+    Find every position on the board of every rotated shape of every tetris
+    piece, so the tetris solvers never need to translate shapes themselves.
+
+    'tetris_placements' maps each shape (as a frozenset of (x, y) cells) to a
+    list of (mask, cells) placements, where 'mask' is a bitmask of the cells
+    covered and 'cells' is a tuple of their bit numbers.  A placement fits in
+    an area if mask & ~area == 0.
+
+    'piece_placements' maps each piece to the placements of all its shapes and
+    'anchored_placements' to a list, for every cell, of its placements whose
+    first cell that is.
+    'piece_extents' maps each piece to the (width, height) of its shapes and
+    'piece_differences' to the difference between the number of black and
+    white cells it covers if the board is coloured like a chessboard, as
+    'black_cells' is.
+    'piece_types' maps each piece to a description which is the same for
+    identical pieces anywhere on any board: its first shape (once sorted) out
+    of all its rotations, whether it can be rotated and its colour.
+    """
+
+    self.row_mask = (1 << self.width) - 1
+    self.black_cells = 0
+    for (x, y), bit in self.cell_bits.iteritems():
+      if (x + y) % 2 == 0:
+        self.black_cells |= bit
+
+    self.tetris_placements = {}
+    self.piece_placements = {}
+    self.anchored_placements = {}
+    self.piece_extents = {}
+    self.piece_differences = {}
+    self.piece_types = {}
+    for x, y in self.tetris:
+      piece = self.cells[y][x].tetris
+      self.piece_types[piece] = (min(tuple(sorted(shape))
+                                     for shape in piece.shapes),
+                                 piece.rotated, piece.negative)
+      self.piece_placements[piece] = []
+      self.piece_extents[piece] = []
+      self.piece_differences[piece] = abs(sum(1 if (px + py) % 2 == 0 else -1
+                                              for px, py in piece.shape))
+      for shape in piece.shapes:
+        xs = [px for px, py in shape]
+        ys = [py for px, py in shape]
+        self.piece_extents[piece].append((max(xs) - min(xs) + 1,
+                                          max(ys) - min(ys) + 1))
+        shape = frozenset(shape)
+        if shape not in self.tetris_placements:
+          placements = []
+          for ty in range(self.height):
+            for tx in range(self.width):
+              cells = [(tx + px, ty + py) for px, py in shape]
+              if all(0 <= cx < self.width and 0 <= cy < self.height
+                     for cx, cy in cells):
+                mask = 0
+                for cell in cells:
+                  mask |= self.cell_bits[cell]
+                placements.append((mask, tuple(sorted(
+                  cy * self.width + cx for cx, cy in cells))))
+          self.tetris_placements[shape] = placements
+        self.piece_placements[piece].extend(self.tetris_placements[shape])
+
+      self.anchored_placements[piece] = \
+        [[] for cell in range(self.width * self.height)]
+      for placement in self.piece_placements[piece]:
+        self.anchored_placements[piece][placement[1][0]].append(placement)
+
+
+  def solve_worker(self, worker, tasks, idle, outstanding, results, cancel):
+    """
+    Search every path beginning with each path taken from the 'tasks' queue,
+    in a worker process.  'idle' counts the workers waiting for a path and
+    'outstanding' counts the paths which have not been searched yet.
+    Progress and the outcome are put on the 'results' queue as (message,
+    worker, (path attempts, area cache hits, area cache misses, bytes of blue
+    tetris results), data) and the search stops early if 'cancel' is set.
+    """
+
+    # Don't make the same random choices as every other worker
+    random.seed()
+
+    def report():
+      if cancel.is_set():
+        self.keep_solving = False
+      results.put(("progress", worker, self.stats(), self.path))
+
+    # Observers belong to the parent process, so just report back to it
+    self.observers = [report]
+
+    # Paths shared by this worker which are never taken, because solving has
+    # been cancelled, mustn't stop it from finishing
+    tasks.cancel_join_thread()
+    self.tasks = tasks
+    self.idle = idle
+    self.outstanding = outstanding
+
+    while self.keep_solving and not self.solution_found:
+      try:
+        path = tasks.get(False)
+      except Empty:
+        # Every path has been searched
+        if not outstanding.value:
+          break
+
+        # Wait for another worker to share some of its paths
+        with idle.get_lock():
+          idle.value += 1
+        try:
+          path = tasks.get(timeout=self.yield_interval)
+        except Empty:
+          path = None
+        with idle.get_lock():
+          idle.value -= 1
+
+        report()
+        if path is None:
+          continue
+
+      self.check_all_paths(path)
+      with outstanding.get_lock():
+        outstanding.value -= 1
+
+    if self.tetris_cache is not None:
+      self.tetris_cache.commit()
+
+    if self.solution_found:
+      results.put(("solved", worker, self.stats(),
+                   (self.path, self.areas, self.removed_pieces,
+                    self.removed_nodes, self.removed_v_edges,
+                    self.removed_h_edges)))
+    else:
+      results.put(("done", worker, self.stats(), None))
+
+
+  def stats(self):
+    """
+    Return the path attempts, area cache hits and misses so far and the size
+    of the blue tetris results.
+    """
+
+    return self.path_attempts, self.area_cache_hits, self.area_cache_misses, \
+           self.blue_tetris_bytes
+
+
+  def solve_parallel(self):
+    """
+    Search in 'processes' worker processes.  These are forked once everything
+    about the puzzle has been worked out, so they share it without having to
+    work it out again.  They must be forked: the puzzle, its observers and
+    its tetris cache can't be pickled to start them any other way, so this
+    isn't available on Windows.
+
+    The workers begin with a path for each start node.  Whenever a worker is
+    idle, a busy worker shares the next nodes still to be tried nearest the
+    start of its path, so work is split by path prefix however many start
+    nodes there are.  The first solution found cancels the other workers, and
+    progress from every worker is passed on to observers.
+    """
+
+    tasks = multiprocessing.Queue()
+    idle = multiprocessing.Value("i", 0)
+    outstanding = multiprocessing.Value("i", len(self.search_start_nodes))
+    results = multiprocessing.Queue()
+    cancel = multiprocessing.Event()
+    # An observer may stop this solve and start another before returning, so
+    # stop() must be able to cancel the workers itself
+    self.cancel = cancel
+
+    for start_node in self.search_start_nodes:
+      tasks.put([start_node])
+
+    workers = []
+    for worker in range(self.processes):
+      process = multiprocessing.Process(target=self.solve_worker,
+                                        args=(worker, tasks, idle, outstanding,
+                                              results, cancel))
+      process.daemon = True
+      process.start()
+      workers.append(process)
+
+    # The latest stats from each worker, which begins with the blue tetris
+    # results from before it was forked
+    worker_stats = [(0, 0, 0, self.blue_tetris_bytes)] * len(workers)
+
+    # Wait until every worker has finished, whether or not it has been
+    # cancelled, so that nothing is left on the results queue
+    running = len(workers)
+    while running:
+      try:
+        message, worker, stats, data = \
+          results.get(timeout=self.yield_interval)
+      except Empty:
+        message = None
+
+      if message is not None:
+        worker_stats[worker] = stats
+
+      if message == "progress":
+        # Show the latest path until a solution has been found
+        if data and not self.solution_found:
+          self.path = data
+
+      elif message is not None:
+        # The worker has finished
+        running -= 1
+
+        if message == "solved" and not self.solution_found:
+          # The first solution wins
+          self.solution_found = True
+          self.path, self.areas, self.removed_pieces, self.removed_nodes, \
+            self.removed_v_edges, self.removed_h_edges = data
+          cancel.set()
+
+      # Every worker starts with a copy of the blue tetris results from before
+      # it was forked, so their sizes aren't added up, but the largest is shown
+      path_attempts, area_cache_hits, area_cache_misses, blue_tetris_bytes = \
+        zip(*worker_stats)
+      self.path_attempts = sum(path_attempts)
+      self.area_cache_hits = sum(area_cache_hits)
+      self.area_cache_misses = sum(area_cache_misses)
+      self.blue_tetris_bytes = max(blue_tetris_bytes)
+
+      self.yield_check()
+
+      # Solving has been cancelled
+      if not self.keep_solving:
+        cancel.set()
+
+    for process in workers:
+      process.join()
+    self.cancel = None
+
+    # The workers' blue tetris results went with them
+    self.blue_tetris_bytes = sum(pieces_results[2] for pieces_results
+                                 in self.blue_tetris_areas.values())
+
 
   def solve(self, randomise=False):
     """
@@ -982,6 +2487,10 @@ class Puzzle(object):
     self.keep_solving = True
     self.path = []
     self.path_attempts = 0
+    self.area_cache.clear()
+    self.area_cache_bytes = 0
+    self.area_cache_hits = 0
+    self.area_cache_misses = 0
     self.time_taken = 0
     self.start_time = time.time()
     # Yield every yield_interval to allow observers to do some processing
@@ -997,21 +2506,25 @@ class Puzzle(object):
       self.message = "Cannot solve: no end nodes"
       return
 
-    # A map from a set of tetris pieces to a set of valid areas
-    self.blue_tetris_areas = {}
+    # Where every tetris piece can be placed on the board
+    self.compile_placements()
 
     # Sets of which pieces and edges were removed by elimination marks
     # (including the elimination marks)
-    self.removed_pieces = set()
-    self.removed_h_edges = set()
-    self.removed_v_edges = set()
+    self.clear_removed()
 
     if self.randomise:
-      random.shuffle(self.start_nodes)
-    for start_node in self.start_nodes:
-      self.check_all_paths(start_node)
-      if self.solution_found:
-        break
+      random.shuffle(self.search_start_nodes)
+    if self.processes > 1:
+      self.solve_parallel()
+    else:
+      for start_node in self.search_start_nodes:
+        self.check_all_paths([start_node])
+        if self.solution_found:
+          break
+
+    if self.tetris_cache is not None:
+      self.tetris_cache.commit()
 
     if not self.keep_solving:
       return
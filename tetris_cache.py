@@ -0,0 +1,100 @@
+import os, sqlite3
+
+# Tetris results remembered on disk
+
+class TetrisCache(object):
+  def __init__(self, filename):
+    """
+    Results of blue tetris layering, stored in an SQLite database so that they
+    are remembered between solves and shared by every process solving at the
+    same time.
+
+    Keys are strings describing the board size, pieces and target area (see
+    Puzzle.solve_blue_tetris()) and results are True or False.
+
+    Each process opens its own connection the first time it is used, as an
+    SQLite connection can't be used by a process forked from the one which
+    opened it.  Results are only committed by commit(), so that storing one
+    doesn't wait for the disk.  If the database can't be used, the cache is
+    disabled, everything is a miss and the reason is kept in 'error'.
+    """
+
+    self.filename = filename
+    self.connection = None
+    self.pid = None
+    self.pending = False
+    self.disabled = False
+    self.error = None
+
+  def connect(self):
+    """Return a connection for this process, or None if disabled."""
+
+    if self.disabled:
+      return None
+
+    if self.pid != os.getpid():
+      try:
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+          os.makedirs(directory)
+        self.connection = sqlite3.connect(self.filename, timeout=30)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS layering "
+                                "(key TEXT PRIMARY KEY, valid INTEGER)")
+        self.connection.commit()
+        self.pid = os.getpid()
+        self.pending = False
+      except (sqlite3.Error, OSError) as e:
+        self.disable(e)
+        return None
+
+    return self.connection
+
+  def disable(self, error):
+    self.error = error
+    self.disabled = True
+    self.connection = None
+
+  def get(self, key):
+    """Return the result stored for a key, or None if there isn't one."""
+
+    connection = self.connect()
+    if connection is None:
+      return None
+
+    try:
+      row = connection.execute("SELECT valid FROM layering WHERE key = ?",
+                               (key,)).fetchone()
+    except sqlite3.Error as e:
+      self.disable(e)
+      return None
+
+    if row is None:
+      return None
+
+    return bool(row[0])
+
+  def put(self, key, valid):
+    """Store the result for a key, to be committed by commit()."""
+
+    connection = self.connect()
+    if connection is None:
+      return
+
+    try:
+      connection.execute("INSERT OR REPLACE INTO layering VALUES (?, ?)",
+                         (key, int(valid)))
+      self.pending = True
+    except sqlite3.Error as e:
+      self.disable(e)
+
+  def commit(self):
+    """Commit any results stored by this process since the last commit."""
+
+    if not self.pending or self.disabled or self.pid != os.getpid():
+      return
+
+    try:
+      self.connection.commit()
+      self.pending = False
+    except sqlite3.Error as e:
+      self.disable(e)
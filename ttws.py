@@ -1,7 +1,13 @@
-import argparse
+import os, sys, argparse
 from ui import UI
+from tetris_cache import TetrisCache
 
 if __name__ == "__main__":
+  # Blue tetris results are remembered in the user's cache directory by
+  # default, rather than wherever the solver happens to be run from
+  cache_directory = os.environ.get("XDG_CACHE_HOME") or \
+                    os.path.join(os.path.expanduser("~"), ".cache")
+
   parser = argparse.ArgumentParser(description="""\
 TTWS - The \"The Witness\" Solver""")
   parser.add_argument("-p", "--puzzle",
@@ -9,14 +15,38 @@ TTWS - The \"The Witness\" Solver""")
                            "https://windmill.thefifthmatt.com)")
   parser.add_argument("-f", "--file",
                       help="File containing a list of puzzle codes")
+  parser.add_argument("-j", "--jobs", type=int, default=1,
+                      help="Number of processes to solve with")
+  parser.add_argument("-c", "--tetris-cache",
+                      default=os.path.join(cache_directory, "ttws",
+                                           "tetris_cache"),
+                      help="File to remember blue tetris results in, shared "
+                           "between runs (default ~/.cache/ttws/tetris_cache, "
+                           "set to \"\" to disable)")
+  parser.add_argument("-a", "--area-cache", type=int, default=32,
+                      help="Megabytes of memory to remember whether areas are "
+                           "valid in, in each process")
 
   args = parser.parse_args()
 
+  # Worker processes are forked with the puzzle already set up (see
+  # Puzzle.solve_parallel()), which Windows can't do
+  if args.jobs > 1 and sys.platform == "win32":
+    parser.error("solving with more than one process needs fork(), which "
+                 "isn't available on Windows")
+
   puzzles = []
   if args.puzzle:
     puzzles = [args.puzzle]
   elif args.file:
     puzzles = [line.strip() for line in open(args.file).readlines()]
 
+  tetris_cache = None
+  if args.tetris_cache:
+    tetris_cache = TetrisCache(args.tetris_cache)
+    if tetris_cache.connect() is None:
+      print "Cannot use tetris cache '%s': %s" % (args.tetris_cache,
+                                                  tetris_cache.error)
+
   # Preload the UI with none, one or many puzzle codes
-  UI(puzzles)
+  UI(puzzles, args.jobs, tetris_cache, args.area_cache * 1024 * 1024)
@@ -76,9 +76,15 @@ def shade_rgb(colour, percent):
   return (int(r), int(g), int(b))
 
 class UI(object):
-  def __init__(self, puzzles=[]):
+  def __init__(self, puzzles=[], processes=1, tetris_cache=None,
+               area_cache_size=32 * 1024 * 1024):
     self.current_puzzle = 0
     self.puzzle_codes = puzzles
+    self.processes = processes
+    # Blue tetris results are remembered in this TetrisCache, if given
+    self.tetris_cache = tetris_cache
+    # The most memory, in bytes, to remember area results in
+    self.area_cache_size = area_cache_size
 
     pygame.init()
 
@@ -119,15 +125,15 @@ class UI(object):
         self.calculate_sizes()
 
       elif event.type == pygame.QUIT:
-        self.puzzle.keep_solving = False
+        self.puzzle.stop()
         self.quit = True
 
       elif event.type == pygame.KEYDOWN:
         if pygame.key.name(event.key) == "q":
-          self.puzzle.keep_solving = False
+          self.puzzle.stop()
           self.quit = True
         elif pygame.key.name(event.key) == "n":
-          self.puzzle.keep_solving = False
+          self.puzzle.stop()
           self.puzzle = Puzzle(random.randint(1, 6), random.randint(1, 5))
           self.puzzle.randomise()
           self.initialise()
@@ -135,12 +141,12 @@ class UI(object):
         elif pygame.key.name(event.key) == "s":
           self.puzzle.solve()
         elif pygame.key.name(event.key) == "r":
-          self.puzzle.keep_solving = False
+          self.puzzle.stop()
           self.puzzle.solve(randomise=True)
         elif pygame.key.name(event.key) == "right":
           # Load next puzzle
           if self.current_puzzle < len(self.puzzle_codes) - 1:
-            self.puzzle.keep_solving = False
+            self.puzzle.stop()
             self.current_puzzle += 1
             print "loading puzzle %s" % (self.current_puzzle + 1)
             self.puzzle = decode_pb(self.puzzle_codes[self.current_puzzle])
@@ -149,7 +155,7 @@ class UI(object):
         elif pygame.key.name(event.key) == "left":
           # Load previous puzzle
           if self.current_puzzle > 0:
-            self.puzzle.keep_solving = False
+            self.puzzle.stop()
             self.current_puzzle -= 1
             print "loading puzzle %s" % (self.current_puzzle + 1)
             self.puzzle = decode_pb(self.puzzle_codes[self.current_puzzle])
@@ -163,10 +169,12 @@ class UI(object):
 
           try:
             # TODO: make the save/load mechanism better!
-            self.puzzle = decode_pb(text)
+            puzzle = decode_pb(text)
           except:
             print "Cannot load puzzle from text '%s'" % text
             break
+          self.puzzle.stop()
+          self.puzzle = puzzle
 
           # Puzzle is loadable - store it in a file
           f = open("pasted_puzzles", "a")
@@ -189,6 +197,9 @@ class UI(object):
 
   def initialise(self):
     self.calculate_sizes()
+    self.puzzle.processes = self.processes
+    self.puzzle.tetris_cache = self.tetris_cache
+    self.puzzle.area_cache_size = self.area_cache_size
     self.puzzle.register_observer(self.force_update)
 
   def calculate_sizes(self):
@@ -418,7 +429,7 @@ class UI(object):
     self.screen.blit(text_surf, (20, status_top + 5))
     text_surf = font.render("Time taken: %0.2fs" % (self.puzzle.time_taken), True, (0,0,0))
     self.screen.blit(text_surf, (20, status_top + 30))
-    text_surf = font.render("Paths attempted: {:,}".format(self.puzzle.path_attempts), True, (0,0,0))
+    text_surf = font.render("Paths attempted: {:,}    Area cache hits: {:,}    Misses: {:,}    Tetris results: {:,} KB".format(self.puzzle.path_attempts, self.puzzle.area_cache_hits, self.puzzle.area_cache_misses, self.puzzle.blue_tetris_bytes // 1024), True, (0,0,0))
     self.screen.blit(text_surf, (20, status_top + 55))
 
     pygame.display.flip()